@@ -0,0 +1,137 @@
+"""
+Load test for the read endpoints polled by kiosks: GET /api/products/ (mostly
+conditional, answered 304), GET /api/products/<id>/ and GET /api/balance/.
+
+Compares three ways of serving the same traffic in-process:
+
+    wsgi         DRF views behind the WSGI handler, one thread per worker
+    asgi-sync    DRF views behind the ASGI handler (each runs via sync_to_async)
+    asgi-async   sales.async_views behind the ASGI handler (ASYNC_READ_VIEWS)
+    
+    python benchmarks/async_reads.py [clients] [requests_per_client] [wsgi_threads]
+
+This measures handler overhead and the concurrency ceiling of each stack, not
+network throughput; for that, run uvicorn/gunicorn against a real database
+and point a load generator (hey, wrk, k6) at it.
+"""
+import asyncio
+import importlib
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import setup_django, seed_products
+
+
+def polls(index, product_ids, count):
+    for i in range(count):
+        kind = (index + i) % 10
+        if kind < 8:
+            yield '/api/products/', True
+        elif kind == 8:
+            yield f'/api/products/{product_ids[i % len(product_ids)]}/', False
+        else:
+            yield '/api/balance/', False
+
+
+def use_async_views(enabled):
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import sales.urls
+    import vending_machine.urls
+    
+    settings.ASYNC_READ_VIEWS = enabled
+    importlib.reload(sales.urls)
+    importlib.reload(vending_machine.urls)
+    clear_url_caches()
+
+
+def summarize(label, latencies, elapsed, errors):
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f'{label:<11} {len(latencies) / elapsed:>9.0f} req/s   '
+        f'p50 {statistics.median(latencies) * 1000:>7.2f} ms   p95 {p95 * 1000:>7.2f} ms   errors {errors}'
+    )
+
+
+def run_wsgi(token, etag, product_ids, clients, per_client, threads):
+    from django.db import connection
+    from django.test import Client
+    
+    latencies = []
+    errors = []
+    
+    def client_loop(index):
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            for path, conditional in polls(index, product_ids, per_client):
+                headers = {'If-None-Match': etag} if conditional else {}
+                start = time.perf_counter()
+                response = client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code not in (200, 304):
+                    errors.append(response.status_code)
+        finally:
+            connection.close()
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(client_loop, range(clients)))
+    summarize('wsgi', latencies, time.perf_counter() - start, len(errors))
+
+
+def run_asgi(label, token, etag, product_ids, clients, per_client):
+    from django.test import AsyncClient
+    
+    latencies = []
+    errors = []
+    
+    async def client_loop(index):
+        client = AsyncClient()
+        for path, conditional in polls(index, product_ids, per_client):
+            headers = {'Authorization': f'Bearer {token}'}
+            if conditional:
+                headers['If-None-Match'] = etag
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in (200, 304):
+                errors.append(response.status_code)
+    
+    async def main():
+        await asyncio.gather(*(client_loop(i) for i in range(clients)))
+    
+    start = time.perf_counter()
+    asyncio.run(main())
+    summarize(label, latencies, time.perf_counter() - start, len(errors))
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    setup_django()
+    
+    from sales.authentication import generate_jwt_token
+    from sales.catalog import catalog_etag, get_catalog_version
+    from sales.models import ActiveSession, Product, User, token_digest
+    
+    seed_products(500)
+    buyer = User.objects.create(username='bench_buyer', role='buyer', deposit=50)
+    token = generate_jwt_token(buyer)
+    ActiveSession.objects.create(user=buyer, token_digest=token_digest(token))
+    product_ids = list(Product.objects.values_list('id', flat=True)[:50])
+    etag = catalog_etag(get_catalog_version())
+    
+    print(f'{clients} clients x {per_client} requests, {threads} WSGI threads')
+    use_async_views(False)
+    run_wsgi(token, etag, product_ids, clients, per_client, threads)
+    run_asgi('asgi-sync', token, etag, product_ids, clients, per_client)
+    use_async_views(True)
+    run_asgi('asgi-async', token, etag, product_ids, clients, per_client)
+
+
+if __name__ == '__main__':
+    main()
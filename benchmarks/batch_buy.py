@@ -0,0 +1,96 @@
+"""
+Contention benchmark for buying a cart: N concurrent buyers, each buying the
+same cart of products over and over, either as one POST /api/buy/ call per
+item (in a different order per buyer) or as a single POST /api/buy/batch/
+call. Every cart overlaps every other, so the products' rows are contended
+in both modes.
+
+    python benchmarks/batch_buy.py [buyers] [cart_size] [carts_per_buyer]
+
+Meaningful numbers need PostgreSQL (DATABASE_URL); SQLite serializes all
+writers on a database-wide lock, so there it runs with a single buyer and
+measures per-transaction overhead only.
+"""
+import random
+import sys
+import threading
+import time
+
+from common import setup_django
+
+
+def run_mode(name, buy_cart, buyers, carts):
+    from django.db import connection
+    from rest_framework.test import APIClient
+    
+    errors = []
+    
+    def worker(index, user, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            for _ in range(carts):
+                errors.extend(buy_cart(client, user, index))
+        finally:
+            connection.close()
+    
+    threads = [threading.Thread(target=worker, args=(index, *buyer)) for index, buyer in enumerate(buyers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    total = len(buyers) * carts
+    print(f'{name:<18} {total / elapsed:>8.1f} carts/s  ({len(errors)} failed requests, {total} carts)')
+
+
+def main(buyer_count, cart_size, carts):
+    setup_django()
+    from django.db import connection
+    from django.urls import reverse
+    from sales.authentication import generate_jwt_token
+    from sales.models import ActiveSession, Product, User, token_digest
+    
+    if connection.vendor == 'sqlite' and buyer_count > 1:
+        print('SQLite allows a single writer at a time; running with 1 buyer')
+        buyer_count = 1
+    
+    seller = User.objects.create(username='bench_seller', role='seller')
+    products = Product.objects.bulk_create([
+        Product(product_name=f'Product {i}', cost=5, amount_available=10 ** 6, seller=seller)
+        for i in range(cart_size)
+    ])
+    buyers = []
+    for i in range(buyer_count):
+        user = User.objects.create(username=f'bench_buyer_{i}', role='buyer')
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        buyers.append((user, token))
+    # Each buyer walks the cart in its own order, as independent clients would.
+    orders = [random.Random(i).sample(products, len(products)) for i in range(buyer_count)]
+    
+    def sequential(client, user, index):
+        failed = []
+        for product in orders[index]:
+            User.objects.filter(id=user.id).update(deposit=5)
+            response = client.post(reverse('buy'), {'product_id': product.id, 'amount': 1}, format='json')
+            if response.status_code != 200:
+                failed.append(response.status_code)
+        return failed
+    
+    def batch(client, user, index):
+        User.objects.filter(id=user.id).update(deposit=5 * cart_size)
+        items = [{'product_id': product.id, 'amount': 1} for product in orders[index]]
+        response = client.post(reverse('buy_batch'), {'items': items}, format='json')
+        return [] if response.status_code == 200 else [response.status_code]
+    
+    print(f'{buyer_count} buyers, {cart_size}-item carts')
+    run_mode('sequential /buy/', sequential, buyers, carts)
+    run_mode('/buy/batch/', batch, buyers, carts)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [16, 5, 50][len(args):]))
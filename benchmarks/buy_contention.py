@@ -0,0 +1,82 @@
+"""
+Contention benchmark for POST /api/buy/: N concurrent buyers hammering one
+product, with BUY_MODE='locking' (SELECT ... FOR UPDATE),
+BUY_MODE='optimistic' (guarded conditional UPDATEs) and, with
+STOCK_SHARDING=True, the product's stock split over 16 shard rows.
+
+    python benchmarks/buy_contention.py [buyers] [purchases_per_buyer]
+
+Meaningful numbers need PostgreSQL (DATABASE_URL); SQLite serializes all
+writers on a database-wide lock, so there it runs with a single buyer.
+"""
+import sys
+import threading
+import time
+
+from common import setup_django
+
+
+def run_mode(mode, product, buyers, purchases):
+    from django.db import connection
+    from django.test import override_settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+    from sales.models import User
+    
+    errors = []
+    
+    def worker(user, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            for _ in range(purchases):
+                User.objects.filter(id=user.id).update(deposit=product.cost)
+                response = client.post(reverse('buy'), {'product_id': product.id, 'amount': 1}, format='json')
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+        finally:
+            connection.close()
+    
+    overrides = {'STOCK_SHARDING': True} if mode == 'sharded' else {'BUY_MODE': mode}
+    with override_settings(**overrides):
+        threads = [threading.Thread(target=worker, args=buyer) for buyer in buyers]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    
+    total = len(buyers) * purchases
+    print(f'{mode:<11} {total / elapsed:>8.1f} purchases/s  ({len(errors)} failed of {total})')
+
+
+def main(buyer_count, purchases):
+    setup_django()
+    from django.db import connection
+    from sales.authentication import generate_jwt_token
+    from sales.models import ActiveSession, Product, User, token_digest
+    from sales.stock import shard_stock
+    
+    if connection.vendor == 'sqlite' and buyer_count > 1:
+        print('SQLite allows a single writer at a time; running with 1 buyer')
+        buyer_count = 1
+    
+    seller = User.objects.create(username='bench_seller', role='seller')
+    product = Product.objects.create(product_name='Hot item', cost=50, amount_available=10 ** 6, seller=seller)
+    buyers = []
+    for i in range(buyer_count):
+        user = User.objects.create(username=f'bench_buyer_{i}', role='buyer')
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        buyers.append((user, token))
+    
+    for mode in ['locking', 'optimistic']:
+        run_mode(mode, product, buyers, purchases)
+    shard_stock(product.id, 16)
+    run_mode('sharded', product, buyers, purchases)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [16, 50][len(args):]))
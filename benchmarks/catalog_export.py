@@ -0,0 +1,54 @@
+"""
+Peak Python memory of a full catalog dump: rendering the whole product list
+in one go (what paging through GET /api/products/ without a limit costs)
+versus the chunked stream behind GET /api/products/export/.
+
+    python benchmarks/catalog_export.py [sizes...]
+"""
+import sys
+import time
+import tracemalloc
+
+from common import seed_products, setup_django
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+
+def main(sizes):
+    setup_django()
+    from sales.models import Product
+    from sales.product_export import export_chunks
+    from sales.renderers import FastJSONRenderer
+    from sales.serializers import product_rows, serialize_product_rows
+    
+    renderer = FastJSONRenderer()
+    
+    def materialized():
+        return len(renderer.render(serialize_product_rows(product_rows(Product.objects.order_by('id')))))
+    
+    def streamed():
+        return sum(len(chunk) for chunk in export_chunks('ndjson'))
+    
+    seeded = 0
+    print(f'{"products":>10} {"list peak":>11} {"stream peak":>12} {"list time":>10} {"stream time":>12}')
+    for size in sizes:
+        seed_products(size - seeded)
+        seeded = size
+        _, list_time, list_peak = measure(materialized)
+        _, stream_time, stream_peak = measure(streamed)
+        print(
+            f'{size:>10} {list_peak / 2**20:>9.1f}MB {stream_peak / 2**20:>10.1f}MB '
+            f'{list_time * 1000:>8.0f}ms {stream_time * 1000:>10.0f}ms'
+        )
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
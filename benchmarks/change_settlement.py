@@ -0,0 +1,50 @@
+"""
+Time change computation for a refund run: the legacy per-coin while loop,
+per-amount table lookups, and batch_change (NumPy when installed).
+
+    python benchmarks/change_settlement.py [refunds]
+"""
+import random
+import sys
+import timeit
+
+from common import setup_django
+
+
+def legacy_calculate_change(amount):
+    change = []
+    for coin in [100, 50, 20, 10, 5]:
+        while amount >= coin:
+            change.append(coin)
+            amount -= coin
+    return change
+
+
+def main(refunds):
+    setup_django()
+    from unittest import mock
+    from sales import change
+    
+    rng = random.Random(0)
+    amounts = [5 * rng.randrange(0, change.TABLE_LIMIT // 5 + 1) for _ in range(refunds)]
+    
+    def batch_without_numpy():
+        with mock.patch.object(change, 'numpy', None):
+            change.batch_change(amounts)
+    
+    cases = [
+        ('legacy loop', lambda: [legacy_calculate_change(a) for a in amounts]),
+        ('table lookups', lambda: [change.make_change(a) for a in amounts]),
+        ('batch_change (lists)', batch_without_numpy),
+    ]
+    if change.numpy is not None:
+        cases.append(('batch_change (numpy)', lambda: change.batch_change(amounts)))
+    
+    print(f'{refunds} refunds')
+    for name, func in cases:
+        seconds = min(timeit.repeat(func, number=5, repeat=3)) / 5
+        print(f'{name:<22} {seconds * 1000:>10.2f}ms')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vending_machine.settings')
+    import django
+    django.setup()
+    
+    # Benchmarks run against a throwaway test database, never the real one.
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def seed_products(count, sellers=10):
+    from sales.models import User, Product
+    
+    seller_objs = [
+        User.objects.get_or_create(username=f'bench_seller_{i}', defaults={'role': 'seller'})[0]
+        for i in range(sellers)
+    ]
+    Product.objects.bulk_create(
+        [
+            Product(
+                product_name=f'Product {i}',
+                cost=5 * (1 + i % 40),
+                amount_available=i % 50,
+                seller=seller_objs[i % sellers],
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
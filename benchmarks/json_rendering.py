@@ -0,0 +1,57 @@
+"""
+Micro-benchmark of DRF's JSONRenderer/JSONParser against the orjson-backed
+FastJSONRenderer/FastJSONParser on the product list and the buy response.
+
+    python benchmarks/json_rendering.py [products]
+"""
+import io
+import sys
+import timeit
+
+from common import seed_products, setup_django
+
+
+def report(name, baseline, fast, number):
+    slow_time = min(timeit.repeat(baseline, number=number, repeat=3)) / number
+    fast_time = min(timeit.repeat(fast, number=number, repeat=3)) / number
+    print(f'{name:<28} {slow_time * 1e6:>10.1f}us {fast_time * 1e6:>10.1f}us {slow_time / fast_time:>7.1f}x')
+
+
+def main(products):
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from sales.models import Product
+    from sales.parsers import FastJSONParser
+    from sales.renderers import FastJSONRenderer, orjson
+    from sales.serializers import product_rows, serialize_product_rows
+    
+    if orjson is None:
+        print('orjson is not installed; FastJSONRenderer is using the stdlib fallback')
+    
+    seed_products(products)
+    product_list = serialize_product_rows(product_rows(Product.objects.order_by('created_at', 'id')))
+    buy_response = {
+        'total_spent': 100,
+        'product_purchased': 'Coca Cola',
+        'amount_purchased': 2,
+        'change': [50, 20, 20, 5],
+    }
+    buy_request = b'{"product_id": 1, "amount": 2}'
+    
+    drf_renderer, fast_renderer = JSONRenderer(), FastJSONRenderer()
+    drf_parser, fast_parser = JSONParser(), FastJSONParser()
+    assert drf_renderer.render(product_list) == fast_renderer.render(product_list)
+    assert drf_renderer.render(buy_response) == fast_renderer.render(buy_response)
+    
+    print(f'{"":<28} {"JSONRenderer":>12} {"fast":>12} {"speedup":>8}')
+    report(f'render product list ({products})',
+           lambda: drf_renderer.render(product_list), lambda: fast_renderer.render(product_list), 20)
+    report('render buy response',
+           lambda: drf_renderer.render(buy_response), lambda: fast_renderer.render(buy_response), 20000)
+    report('parse buy request',
+           lambda: drf_parser.parse(io.BytesIO(buy_request)), lambda: fast_parser.parse(io.BytesIO(buy_request)), 20000)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,58 @@
+"""
+Latency of ?q= product search (the search_queryset() query behind
+GET /api/products/?q=...) as the catalog grows. Names are random
+three-word combinations, so short prefixes match a large share of rows.
+
+    python benchmarks/product_search.py [sizes...]
+
+Runs against the configured backend: FTS5 on SQLite, pg_trgm with
+DATABASE_URL pointing at PostgreSQL.
+"""
+import random
+import sys
+
+from common import best_of, setup_django
+
+WORDS = (
+    'apple', 'banana', 'cherry', 'cola', 'coconut', 'coffee', 'cocoa', 'diet', 'energy', 'fanta', 'grape',
+    'honey', 'iced', 'juice', 'kiwi', 'lemon', 'lime', 'mango', 'mint', 'orange', 'peach', 'pepsi', 'plum',
+    'sparkling', 'sprite', 'still', 'tea', 'tonic', 'vanilla', 'water', 'zero',
+)
+QUERIES = ('c', 'co', 'coc', 'cola', 'coca co', 'sparkling lemon', 'zzz')
+
+
+def seed(count, seller, rng):
+    from sales.models import Product
+    
+    for start in range(0, count, 10000):
+        Product.objects.bulk_create([
+            Product(
+                product_name=' '.join(rng.sample(WORDS, 3)) + f' {i}',
+                cost=5, amount_available=1, seller=seller,
+            )
+            for i in range(start, min(start + 10000, count))
+        ])
+
+
+def main(sizes):
+    setup_django()
+    from sales.models import Product, User
+    from sales.search import search_queryset
+    from sales.serializers import product_rows
+    
+    rng = random.Random(0)
+    seller = User.objects.create(username='bench_seller', role='seller')
+    seeded = 0
+    print(f'{"products":>10} ' + ' '.join(f'{query!r:>18}' for query in QUERIES))
+    for size in sizes:
+        seed(size - seeded, seller, rng)
+        seeded = size
+        timings = [
+            best_of(lambda: list(search_queryset(product_rows(Product.objects.all()), query, 20)), repeat=5)
+            for query in QUERIES
+        ]
+        print(f'{size:>10} ' + ' '.join(f'{timing * 1000:>16.2f}ms' for timing in timings))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,39 @@
+"""
+Compare ProductSerializer(many=True) with the values_list() fast path used by
+product_list / product_detail.
+
+    python benchmarks/product_serialization.py [sizes...]
+"""
+import sys
+
+from common import best_of, seed_products, setup_django
+
+
+def main(sizes):
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from sales.models import Product
+    from sales.serializers import ProductSerializer, product_rows, serialize_product_rows
+    
+    renderer = JSONRenderer()
+    seeded = 0
+    print(f'{"products":>10} {"serializer":>12} {"fast path":>12} {"speedup":>8}')
+    for size in sizes:
+        seed_products(size - seeded)
+        seeded = size
+        queryset = Product.objects.select_related('seller').order_by('created_at', 'id')
+        
+        def drf():
+            return renderer.render(ProductSerializer(queryset.all(), many=True).data)
+        
+        def fast():
+            return renderer.render(serialize_product_rows(product_rows(queryset.all())))
+        
+        assert drf() == fast(), 'fast path output differs from ProductSerializer'
+        slow_time = best_of(drf)
+        fast_time = best_of(fast)
+        print(f'{size:>10} {slow_time * 1000:>10.1f}ms {fast_time * 1000:>10.1f}ms {slow_time / fast_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
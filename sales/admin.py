@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Product, ActiveSession
+from .models import User, Product, ActiveSession, CoinInventory
 
 
 @admin.register(User)
@@ -31,14 +31,20 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ['product_name', 'cost', 'amount_available', 'seller', 'created_at']
     list_filter = ['seller', 'created_at']
     search_fields = ['product_name', 'seller__username']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['stock_shards', 'created_at', 'updated_at']
     ordering = ['-created_at']
     
     fieldsets = (
-        (None, {'fields': ('product_name', 'cost', 'amount_available')}),
+        (None, {'fields': ('product_name', 'cost', 'amount_available', 'stock_shards')}),
         ('Seller Info', {'fields': ('seller',)}),
         ('Timestamps', {'fields': ('created_at', 'updated_at')}),
     )
+    
+    def get_readonly_fields(self, request, obj=None):
+        # A sharded product's stock is in its shards; restock it through the API.
+        if obj is not None and obj.stock_shards:
+            return ['amount_available', *self.readonly_fields]
+        return self.readonly_fields
 
 
 @admin.register(ActiveSession)
@@ -46,9 +52,16 @@ class ActiveSessionAdmin(admin.ModelAdmin):
     list_display = ['user', 'created_at', 'token_preview']
     list_filter = ['created_at']
     search_fields = ['user__username']
-    readonly_fields = ['token', 'created_at']
+    readonly_fields = ['token_preview', 'created_at']
     ordering = ['-created_at']
     
     def token_preview(self, obj):
-        return f"{obj.token[:20]}..." if len(obj.token) > 20 else obj.token
-    token_preview.short_description = 'Token Preview'
\ No newline at end of file
+        return f"{bytes(obj.token_digest).hex()[:20]}..."
+    token_preview.short_description = 'Token Preview'
+
+
+@admin.register(CoinInventory)
+class CoinInventoryAdmin(admin.ModelAdmin):
+    list_display = ['denomination', 'count']
+    list_editable = ['count']
+    ordering = ['-denomination']
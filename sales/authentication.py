@@ -1,13 +1,237 @@
+import copy
+import threading
+import time
 import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .models import User, ActiveSession
+from .models import User, ActiveSession, token_digest
+from . import metrics
+
+
+class PrincipalCache:
+    # Validated principals are kept in this process, but revocations go
+    # through the Django cache named by alias: invalidate_token() and
+    # invalidate_user() write a marker there, and a hit is only served if the
+    # markers are still the ones read before the principal was loaded. When
+    # that cache is shared (Redis, Memcached), a logout or user change handled
+    # by one worker reaches every other worker's next request.
+    def __init__(self, max_size=1024, ttl=60, alias='default'):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    def _token_key(self, token):
+        # Hex, so the key is safe for memcached (no spaces or control bytes).
+        return f'auth:token:{token_digest(token).hex()}'
+
+    def _user_key(self, user_id):
+        return f'auth:user:{user_id}'
+
+    def _marker_keys(self, token, user_id):
+        return [self._token_key(token), self._user_key(user_id)]
+
+    def revisions(self, token, user_id):
+        # Read before loading the principal and pass to set(), so a
+        # revocation that lands in between is not cached over.
+        if not self.enabled():
+            return None
+        keys = self._marker_keys(token, user_id)
+        markers = caches[self.alias].get_many(keys)
+        return tuple(markers.get(key) for key in keys)
+
+    async def arevisions(self, token, user_id):
+        if not self.enabled():
+            return None
+        keys = self._marker_keys(token, user_id)
+        markers = await caches[self.alias].aget_many(keys)
+        return tuple(markers.get(key) for key in keys)
+
+    def get(self, token):
+        entry = self._lookup(token)
+        if entry is None:
+            return None
+        return self._current(token, entry, self.revisions(token, entry[0].id))
+
+    async def aget(self, token):
+        entry = self._lookup(token)
+        if entry is None:
+            return None
+        return self._current(token, entry, await self.arevisions(token, entry[0].id))
+
+    def _lookup(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, expires_at, revisions = entry
+            if expires_at <= time.monotonic():
+                self._discard(token)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+        return user, revisions
+
+    def _current(self, token, entry, revisions):
+        user, cached_revisions = entry
+        with self._lock:
+            if revisions != cached_revisions:
+                # Revoked elsewhere since it was cached.
+                self._discard(token)
+                self.misses += 1
+                return None
+            self.hits += 1
+        # Views mutate request.user, so never hand out the cached instance itself.
+        return copy.copy(user)
+
+    def set(self, token, user, token_exp=None, revisions=None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        if revisions is None:
+            revisions = self.revisions(token, user.id)
+        with self._lock:
+            self._discard(token)
+            self._entries[token] = (copy.copy(user), time.monotonic() + ttl, revisions)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._discard(next(iter(self._entries)))
+
+    def _revoke(self, key):
+        # The marker only has to outlive the entries cached before it.
+        if self.enabled():
+            caches[self.alias].set(key, time.time_ns(), timeout=self.ttl)
+
+    def invalidate_token(self, token):
+        with self._lock:
+            self._discard(token)
+        self._revoke(self._token_key(token))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._discard(token)
+        self._revoke(self._user_key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def _discard(self, token):
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        user_id = entry[0].id
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
 
 
 class JWTAuthentication(BaseAuthentication):
+    cache = PrincipalCache(
+        max_size=getattr(settings, 'JWT_AUTH_CACHE_SIZE', 1024),
+        ttl=getattr(settings, 'JWT_AUTH_CACHE_TTL', 60),
+        alias=getattr(settings, 'JWT_AUTH_CACHE_ALIAS', 'default'),
+    )
+
     def authenticate(self, request):
+        try:
+            return self._authenticate(request)
+        except AuthenticationFailed:
+            metrics.AUTH_FAILURES.inc()
+            raise
+
+    async def aauthenticate(self, request):
+        try:
+            return await self._aauthenticate(request)
+        except AuthenticationFailed:
+            metrics.AUTH_FAILURES.inc()
+            raise
+
+    def _authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        
+        user = self.cache.get(token)
+        if user is not None:
+            return (user, token)
+        
+        payload = self.decode_token(token)
+        revisions = self.cache.revisions(token, payload['user_id'])
+        
+        try:
+            user = User.objects.get(id=payload['user_id'])
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found')
+        
+        if payload.get('type') == 'access':
+            # Short-lived access tokens are revoked by bumping the user's
+            # session generation; only the refresh path consults ActiveSession.
+            if payload.get('gen') != user.session_generation:
+                raise AuthenticationFailed('Session is no longer active')
+        elif not ActiveSession.objects.filter(token_digest=token_digest(token), user=user).exists():
+            raise AuthenticationFailed('Session is no longer active')
+        
+        self.cache.set(token, user, token_exp=payload.get('exp'), revisions=revisions)
+        return (user, token)
+
+    async def _aauthenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        
+        user = await self.cache.aget(token)
+        if user is not None:
+            return (user, token)
+        
+        payload = self.decode_token(token)
+        revisions = await self.cache.arevisions(token, payload['user_id'])
+        
+        try:
+            user = await User.objects.aget(id=payload['user_id'])
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found')
+        
+        if payload.get('type') == 'access':
+            if payload.get('gen') != user.session_generation:
+                raise AuthenticationFailed('Session is no longer active')
+        elif not await ActiveSession.objects.filter(token_digest=token_digest(token), user=user).aexists():
+            raise AuthenticationFailed('Session is no longer active')
+        
+        self.cache.set(token, user, token_exp=payload.get('exp'), revisions=revisions)
+        return (user, token)
+
+    def get_token(self, request):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header:
@@ -20,6 +244,9 @@ class JWTAuthentication(BaseAuthentication):
         except ValueError:
             raise AuthenticationFailed('Invalid authorization header format')
         
+        return token
+
+    def decode_token(self, token):
         try:
             payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
         except jwt.ExpiredSignatureError:
@@ -27,19 +254,28 @@ class JWTAuthentication(BaseAuthentication):
         except jwt.InvalidTokenError:
             raise AuthenticationFailed('Invalid token')
         
-        user_id = payload.get('user_id')
-        if not user_id:
+        if not payload.get('user_id'):
             raise AuthenticationFailed('Invalid token payload')
         
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            raise AuthenticationFailed('User not found')
-        
-        if not ActiveSession.objects.filter(user=user, token=token).exists():
-            raise AuthenticationFailed('Session is no longer active')
+        if payload.get('type') not in (None, 'access'):
+            raise AuthenticationFailed('Invalid token')
         
-        return (user, token)
+        return payload
+
+    @classmethod
+    def invalidate_token(cls, token):
+        cls.cache.invalidate_token(token)
+
+    @classmethod
+    def invalidate_user(cls, user_id):
+        cls.cache.invalidate_user(user_id)
+
+    @classmethod
+    def cache_stats(cls):
+        return cls.cache.stats()
+
+
+SESSION_TOKEN_LIFETIME = timedelta(days=1)
 
 
 def generate_jwt_token(user):
@@ -47,8 +283,75 @@ def generate_jwt_token(user):
         'user_id': user.id,
         'username': user.username,
         'role': user.role,
-        'exp': datetime.utcnow() + timedelta(days=1),
+        'exp': datetime.utcnow() + SESSION_TOKEN_LIFETIME,
         'iat': datetime.utcnow()
     }
     token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
-    return token
\ No newline at end of file
+    return token
+
+
+def refresh_tokens_enabled():
+    return getattr(settings, 'JWT_REFRESH_TOKENS_ENABLED', False)
+
+
+def generate_access_token(user):
+    now = datetime.utcnow()
+    payload = {
+        'user_id': user.id,
+        'username': user.username,
+        'role': user.role,
+        'type': 'access',
+        'gen': user.session_generation,
+        'exp': now + timedelta(seconds=getattr(settings, 'JWT_ACCESS_TOKEN_LIFETIME', 300)),
+        'iat': now
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def generate_refresh_token(user):
+    now = datetime.utcnow()
+    payload = {
+        'user_id': user.id,
+        'type': 'refresh',
+        'gen': user.session_generation,
+        'exp': now + timedelta(seconds=getattr(settings, 'JWT_REFRESH_TOKEN_LIFETIME', 86400)),
+        'iat': now
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def session_lifetime():
+    # Lifetime of the token an ActiveSession row stands for.
+    if refresh_tokens_enabled():
+        return timedelta(seconds=getattr(settings, 'JWT_REFRESH_TOKEN_LIFETIME', 86400))
+    return SESSION_TOKEN_LIFETIME
+
+
+def refresh_access_token(refresh_token):
+    try:
+        payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise AuthenticationFailed('Refresh token has expired')
+    except jwt.InvalidTokenError:
+        raise AuthenticationFailed('Invalid refresh token')
+    
+    if payload.get('type') != 'refresh':
+        raise AuthenticationFailed('Invalid refresh token')
+    
+    session = (
+        ActiveSession.objects.select_related('user')
+        .filter(token_digest=token_digest(refresh_token), user_id=payload.get('user_id'))
+        .first()
+    )
+    if session is None or session.user.session_generation != payload.get('gen'):
+        raise AuthenticationFailed('Session is no longer active')
+    
+    return generate_access_token(session.user)
+
+
+def revoke_sessions(user):
+    ActiveSession.objects.filter(user=user).delete()
+    if refresh_tokens_enabled():
+        # Access tokens have no session row; the generation bump revokes them.
+        User.objects.filter(id=user.id).update(session_generation=F('session_generation') + 1)
+    JWTAuthentication.invalidate_user(user.id)
\ No newline at end of file
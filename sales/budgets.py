@@ -0,0 +1,26 @@
+# Maximum SQL queries per request for every route in sales/urls.py, keyed by
+# URL name and method. Counts are for the default settings with a cold JWT
+# principal cache and catalog snapshot, i.e. the worst common path.
+# QueryBudgetTests pins each one exactly; only raise a budget in the change
+# that needs the extra query.
+QUERY_BUDGETS = {
+    'register': {'POST': 2},
+    'login': {'POST': 2},
+    'token_refresh': {'POST': 1},
+    'logout': {'POST': 3},
+    'logout_all': {'POST': 3},
+    'force_logout_all': {'POST': 2},
+    'product_list': {'GET': 3, 'POST': 3},
+    'product_import': {'POST': 7},  # one chunk; each further chunk adds up to 5
+    'product_export': {'GET': 2},  # the export query runs while streaming, after the view returns
+    'product_detail': {'GET': 3, 'PUT': 4, 'DELETE': 5},  # DELETE cascades to the stock shards
+    'deposit': {'POST': 3},
+    'buy': {'POST': 8},
+    'buy_batch': {'POST': 8},
+    'reset': {'POST': 5},
+    'balance': {'GET': 3},
+}
+
+
+def get_query_budget(url_name, method):
+    return QUERY_BUDGETS.get(url_name, {}).get(method)
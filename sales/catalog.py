@@ -0,0 +1,89 @@
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+from .pagination import get_page_size
+from .search import search_terms
+
+VERSION_KEY = 'catalog:version'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def get_catalog_version():
+    cache = _cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a flushed cache never hands out a version
+        # (and therefore an ETag) that clients may already hold.
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    cache = _cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def _incr_version():
+    cache = _cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+
+
+def bump_catalog_version():
+    # Bump now so this process stops serving the old snapshot, and again on
+    # commit so a snapshot rendered from pre-commit rows elsewhere is dropped.
+    _incr_version()
+    transaction.on_commit(_incr_version)
+
+
+def catalog_etag(version):
+    return f'"catalog-{version}"'
+
+
+def snapshot_params(params):
+    # params: ProductListQuerySerializer.validated_data. Only recognized
+    # parameters select a snapshot, normalized so that requests for the same
+    # page share one and unknown parameters cannot mint new cache entries.
+    normalized = dict(params, page_size=get_page_size(params.get('page_size')))
+    if params.get('q'):
+        # A q without any word still searches (and finds nothing).
+        normalized['q'] = ' '.join(search_terms(params['q']))
+    else:
+        normalized.pop('q', None)
+    return normalized
+
+
+def _snapshot_key(version, params):
+    query = urlencode(sorted(snapshot_params(params).items()))
+    return f'catalog:snapshot:{version}:{hashlib.sha1(query.encode()).hexdigest()}'
+
+
+def get_snapshot(version, params):
+    return _cache().get(_snapshot_key(version, params))
+
+
+async def aget_snapshot(version, params):
+    return await _cache().aget(_snapshot_key(version, params))
+
+
+def set_snapshot(version, params, snapshot):
+    timeout = getattr(settings, 'CATALOG_SNAPSHOT_TTL', 300)
+    _cache().set(_snapshot_key(version, params), snapshot, timeout=timeout)
+
+
+async def aset_snapshot(version, params, snapshot):
+    timeout = getattr(settings, 'CATALOG_SNAPSHOT_TTL', 300)
+    await _cache().aset(_snapshot_key(version, params), snapshot, timeout=timeout)
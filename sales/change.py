@@ -0,0 +1,168 @@
+from array import array
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from .models import CoinInventory
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DENOMINATIONS = (100, 50, 20, 10, 5)
+UNIT = 5
+# Highest balance a buyer can hold (see User.clean); every payout up to it
+# is precomputed below.
+TABLE_LIMIT = 10000
+
+
+class ChangeUnavailable(Exception):
+    pass
+
+
+def inventory_enabled():
+    return getattr(settings, 'TRACK_COIN_INVENTORY', False)
+
+
+def _greedy_counts(amount):
+    counts = []
+    for coin in DENOMINATIONS:
+        count, amount = divmod(amount, coin)
+        counts.append(count)
+    return counts if amount == 0 else None
+
+
+def _build_table():
+    # Row i holds the per-denomination coin counts for i * UNIT cents, packed
+    # into one flat unsigned-short array (about 20 KB for TABLE_LIMIT).
+    table = array('H')
+    for amount in range(0, TABLE_LIMIT + 1, UNIT):
+        table.extend(_greedy_counts(amount))
+    return table
+
+
+CHANGE_TABLE = _build_table()
+NUMPY_CHANGE_TABLE = (
+    numpy.frombuffer(CHANGE_TABLE, dtype=numpy.uint16).reshape(-1, len(DENOMINATIONS))
+    if numpy is not None else None
+)
+
+
+def change_counts(amount):
+    # Per-denomination counts (in DENOMINATIONS order) for an unlimited coin
+    # supply, or None if the amount cannot be paid at all.
+    if amount % UNIT:
+        return None
+    if 0 <= amount <= TABLE_LIMIT:
+        start = amount // UNIT * len(DENOMINATIONS)
+        return CHANGE_TABLE[start:start + len(DENOMINATIONS)]
+    return _greedy_counts(amount)
+
+
+def greedy_change(amount):
+    counts = change_counts(amount)
+    if counts is None:
+        return None
+    return {coin: count for coin, count in zip(DENOMINATIONS, counts) if count}
+
+
+def batch_change(amounts):
+    # Settle many refunds in one call. Returns one row of per-denomination
+    # counts per amount (columns in DENOMINATIONS order): an (n, 5) NumPy
+    # array when NumPy is installed, a list of tuples otherwise.
+    if numpy is not None:
+        amounts = numpy.asarray(amounts, dtype=numpy.int64)
+        if (amounts % UNIT).any() or (amounts < 0).any():
+            raise ValueError('Amounts must be non-negative multiples of %d' % UNIT)
+        if amounts.size == 0 or amounts.max() <= TABLE_LIMIT:
+            return NUMPY_CHANGE_TABLE[amounts // UNIT]
+        
+        counts = numpy.empty((amounts.size, len(DENOMINATIONS)), dtype=numpy.int64)
+        remaining = amounts.copy()
+        for column, coin in enumerate(DENOMINATIONS):
+            counts[:, column], remaining = numpy.divmod(remaining, coin)
+        return counts
+    
+    rows = []
+    for amount in amounts:
+        counts = change_counts(amount) if amount >= 0 else None
+        if counts is None:
+            raise ValueError('Amounts must be non-negative multiples of %d' % UNIT)
+        rows.append(tuple(counts))
+    return rows
+
+
+def make_change(amount, inventory=None):
+    # Minimal-coin payout as {denomination: count}, or None if it cannot be
+    # paid. With no inventory the coin set is canonical, so greedy is optimal.
+    if amount == 0:
+        return {}
+    if inventory is None:
+        return greedy_change(amount)
+    if amount % UNIT:
+        return None
+    
+    # Bounded-coin DP over amount / UNIT states. Each denomination's supply is
+    # split into 1, 2, 4, ... coin bundles (0/1 knapsack items), so the cost
+    # is O(states * sum(log2(count))) -- a few hundred steps for the payouts
+    # this machine makes.
+    states = amount // UNIT
+    unreachable = states + 1
+    coins = [0] + [unreachable] * states
+    counts = [(0,) * len(DENOMINATIONS)] + [None] * states
+    
+    for index, coin in enumerate(DENOMINATIONS):
+        available = min(inventory.get(coin, 0), amount // coin)
+        bundle = 1
+        while available > 0:
+            take = min(bundle, available)
+            available -= take
+            bundle *= 2
+            step = take * coin // UNIT
+            for state in range(states, step - 1, -1):
+                candidate = coins[state - step] + take
+                if candidate < coins[state]:
+                    coins[state] = candidate
+                    previous = counts[state - step]
+                    counts[state] = previous[:index] + (previous[index] + take,) + previous[index + 1:]
+    
+    if counts[states] is None:
+        return None
+    return {coin: count for coin, count in zip(DENOMINATIONS, counts[states]) if count}
+
+
+def expand_change(breakdown):
+    return [coin for coin in DENOMINATIONS for _ in range(breakdown.get(coin, 0))]
+
+
+def current_inventory():
+    return dict(CoinInventory.objects.values_list('denomination', 'count'))
+
+
+def accept_coin(coin):
+    if inventory_enabled():
+        CoinInventory.objects.filter(denomination=coin).update(count=F('count') + 1)
+
+
+def dispense_change(amount):
+    # Must run inside the caller's transaction. Each denomination is drained
+    # with a guarded UPDATE (count >= n) instead of locking the inventory, and
+    # the payout is recomputed if another purchase took the coins first.
+    if not inventory_enabled():
+        return make_change(amount)
+    
+    while True:
+        breakdown = make_change(amount, current_inventory())
+        if breakdown is None:
+            raise ChangeUnavailable(amount)
+        try:
+            with transaction.atomic():
+                for coin, count in breakdown.items():
+                    drained = CoinInventory.objects.filter(denomination=coin, count__gte=count).update(
+                        count=F('count') - count
+                    )
+                    if not drained:
+                        raise ChangeUnavailable(amount)
+        except ChangeUnavailable:
+            continue
+        return breakdown
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def validate_database(alias):
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            # Block until min_size connections are open, so a bad pool
+            # configuration fails here rather than under the first burst.
+            pool.wait(timeout=getattr(settings, 'DB_POOL_TIMEOUT', 10))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            if connection.vendor == 'postgresql':
+                cursor.execute('SHOW statement_timeout')
+                statement_timeout = cursor.fetchone()[0]
+    except Exception as exc:
+        return [Error(f'Cannot use database {alias!r}: {exc}', id='sales.E001')]
+    
+    if connection.vendor == 'postgresql' and statement_timeout == '0':
+        return [Warning(
+            f'Database {alias!r} has no statement timeout',
+            hint='Set DB_STATEMENT_TIMEOUT (milliseconds).',
+            id='sales.W001',
+        )]
+    return []
+
+
+@register(Tags.database)
+def check_databases(app_configs, databases=None, **kwargs):
+    errors = []
+    for alias in databases or ():
+        errors.extend(validate_database(alias))
+    return errors
+
+
+@register(Tags.security)
+def check_authentication_backends(app_configs, **kwargs):
+    # Login and force-logout verify passwords in sales.hashing,
+    # which applies ModelBackend's rules and nothing else.
+    if list(settings.AUTHENTICATION_BACKENDS) != [MODEL_BACKEND]:
+        return [Error(
+            'AUTHENTICATION_BACKENDS is not supported by the API login endpoints',
+            hint=f'Use only {MODEL_BACKEND}; the endpoints check passwords on the hashing pool, not through the backends.',
+            id='sales.E002',
+        )]
+    return []
+
+
+def release_database(alias):
+    # Runs at import in wsgi.py/asgi.py, possibly in a pre-forking server's
+    # parent (gunicorn --preload): give back the connection and shut the pool
+    # the check opened, so no socket or pool thread outlives it. Workers
+    # open their own on first use.
+    connection = connections[alias]
+    connection.close()
+    if connection.vendor == 'postgresql':
+        connection.close_pool()
+
+
+def check_database_on_startup():
+    if not getattr(settings, 'DB_STARTUP_CHECK', False):
+        return
+    
+    try:
+        messages = validate_database('default')
+    finally:
+        release_database('default')
+    errors = [message for message in messages if message.is_serious()]
+    if errors:
+        raise ImproperlyConfigured('; '.join(error.msg for error in errors))
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_login_failed
+from . import metrics
+from .models import User
+
+# PBKDF2 runs in hashlib with the GIL released, so unbounded login bursts eat
+# every core the purchase path needs. All credential hashing goes through one
+# small pool instead: at most `workers` hashes run at once, `queue_size` more
+# may wait, and anything beyond that is refused (HashingBusy -> 503). Only the
+# hash itself runs on the pool; database access stays on the request thread.
+#
+# authenticate_credentials() stands in for django.contrib.auth.authenticate()
+# with ModelBackend, the only backend it supports (checked as sales.E002).
+# It sends user_login_failed the same way, so lockout and audit receivers
+# keep working.
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHashingPool:
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    
+    def submit(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            metrics.PASSWORD_HASHES_REJECTED.inc()
+            raise HashingBusy()
+        
+        metrics.PASSWORD_HASHES_IN_FLIGHT.inc()
+        queued_at = time.perf_counter()
+        
+        def task():
+            started = time.perf_counter()
+            metrics.PASSWORD_HASH_WAIT.observe(started - queued_at)
+            try:
+                return func(*args)
+            finally:
+                metrics.PASSWORD_HASH_DURATION.observe(time.perf_counter() - started)
+                # Freed before the future resolves, so a caller that saw the
+                # result can immediately submit again.
+                self._release()
+        
+        try:
+            return self._executor.submit(task)
+        except BaseException:
+            self._release()
+            raise
+    
+    def run(self, func, *args):
+        return self.submit(func, *args).result()
+    
+    async def arun(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+    
+    def _release(self):
+        metrics.PASSWORD_HASHES_IN_FLIGHT.dec()
+        self._slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordHashingPool(
+                    workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or max(1, (os.cpu_count() or 2) // 2),
+                    queue_size=getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 64),
+                )
+    return _pool
+
+
+def _verify(password, encoded):
+    # Runs on the pool. Hasher upgrades are only recorded here and saved by
+    # the caller, so the pool threads never touch the database.
+    upgrade = []
+    valid = check_password(password, encoded, setter=upgrade.append)
+    return valid, bool(upgrade)
+
+
+def _authenticate_result(user, verified):
+    # Mirrors ModelBackend: inactive users are refused even with a valid password.
+    if user is None or not verified[0] or not user.is_active:
+        return None, False
+    return user, verified[1]
+
+
+def hash_password(password):
+    return get_pool().run(make_password, password)
+
+
+async def ahash_password(password):
+    return await get_pool().arun(make_password, password)
+
+
+def _failed_login_kwargs(username, request):
+    # The password is masked the way authenticate() masks it.
+    return {'credentials': {'username': username, 'password': '*' * 20}, 'request': request}
+
+
+def authenticate_credentials(username, password, request=None):
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        # Hash anyway so unknown usernames take as long as wrong passwords.
+        hash_password(password)
+    else:
+        user, upgrade = _authenticate_result(user, get_pool().run(_verify, password, user.password))
+        if upgrade:
+            user.password = hash_password(password)
+            user.save(update_fields=['password'])
+    if user is None:
+        user_login_failed.send(sender=__name__, **_failed_login_kwargs(username, request))
+    return user
+
+
+async def aauthenticate_credentials(username, password, request=None):
+    user = await User.objects.filter(username=username).afirst()
+    if user is None:
+        await ahash_password(password)
+    else:
+        user, upgrade = _authenticate_result(user, await get_pool().arun(_verify, password, user.password))
+        if upgrade:
+            user.password = await ahash_password(password)
+            await user.asave(update_fields=['password'])
+    if user is None:
+        await user_login_failed.asend(sender=__name__, **_failed_login_kwargs(username, request))
+    return user
@@ -0,0 +1,226 @@
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from sales.models import User, Product
+from sales.views import MAX_DEPOSIT
+
+PASSWORD = 'BenchPass123!'
+COINS = (5, 10, 20, 50, 100)
+ENDPOINTS = ('login', 'deposit', 'products', 'buy', 'reset', 'logout')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._lock = threading.Lock()
+    
+    def record(self, endpoint, latency, queries, status_code):
+        with self._lock:
+            self.samples[endpoint].append((latency, queries, status_code))
+    
+    def report(self, elapsed):
+        endpoints = {}
+        total = 0
+        for endpoint in ENDPOINTS:
+            samples = self.samples.get(endpoint)
+            if not samples:
+                continue
+            total += len(samples)
+            latencies = sorted(sample[0] * 1000 for sample in samples)
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': sum(1 for sample in samples if sample[2] >= 400),
+                'statuses': {str(code): count for code, count in sorted(Counter(s[2] for s in samples).items())},
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                'p99_ms': percentile(latencies, 99),
+                'queries_per_request': sum(sample[1] for sample in samples) / len(samples),
+            }
+        return {
+            'elapsed_s': elapsed,
+            'requests': total,
+            'throughput_rps': total / elapsed if elapsed else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+class BenchClient:
+    def __init__(self, recorder):
+        self.client = Client()
+        self.recorder = recorder
+        self.token = None
+    
+    def call(self, endpoint, method, path, data=None):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        queries = 0
+        
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+        
+        start = time.perf_counter()
+        with connection.execute_wrapper(count_queries):
+            if method == 'get':
+                response = self.client.get(path, data, headers=headers)
+            else:
+                response = self.client.post(path, data, content_type='application/json', headers=headers)
+        self.recorder.record(endpoint, time.perf_counter() - start, queries, response.status_code)
+        return response
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway database and drive mixed buyer traffic through the API, reporting latency and queries per endpoint'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--sellers', type=int, default=5)
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--buyers', type=int, default=20)
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent client threads')
+        parser.add_argument('--iterations', type=int, default=5, help='Sessions per buyer')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+    
+    def handle(self, *args, **options):
+        if options['buyers'] < 1 or options['workers'] < 1 or options['sellers'] < 1:
+            raise CommandError('--sellers, --buyers and --workers must be at least 1')
+        
+        old_name = self.setup_database()
+        try:
+            buyers = self.seed(options)
+            report = self.run(buyers, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+        
+        report['started_at'] = timezone.now().isoformat()
+        report['database'] = connection.vendor
+        report['options'] = {
+            key: options[key] for key in ('sellers', 'products', 'buyers', 'workers', 'iterations', 'seed')
+        }
+        
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+    
+    def setup_database(self):
+        # Never touch the configured database: run against a test copy. SQLite
+        # gets a file instead of shared memory, and IMMEDIATE transactions, so
+        # concurrent writers queue on the busy timeout instead of failing.
+        if connection.vendor == 'sqlite':
+            test_settings = connection.settings_dict.setdefault('TEST', {})
+            test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'bench_{os.getpid()}.sqlite3')
+            connection.settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=30)
+        return connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        password = make_password(PASSWORD)
+        
+        sellers = User.objects.bulk_create([
+            User(username=f'bench_seller_{i}', role='seller', password=password)
+            for i in range(options['sellers'])
+        ])
+        Product.objects.bulk_create([
+            Product(
+                product_name=f'Product {i}',
+                cost=5 * rng.randint(1, 20),
+                amount_available=rng.randint(10, 100),
+                seller=sellers[i % len(sellers)],
+            )
+            for i in range(options['products'])
+        ], batch_size=1000)
+        User.objects.bulk_create([
+            User(username=f'bench_buyer_{i}', role='buyer', password=password)
+            for i in range(options['buyers'])
+        ])
+        return [f'bench_buyer_{i}' for i in range(options['buyers'])]
+    
+    def run(self, buyers, options):
+        recorder = Recorder()
+        failures = []
+        
+        def worker(index):
+            rng = random.Random(options['seed'] * 1000 + index)
+            client = BenchClient(recorder)
+            try:
+                for _ in range(options['iterations']):
+                    for username in buyers[index::options['workers']]:
+                        self.buyer_session(client, username, rng)
+            except Exception as exc:
+                failures.append(exc)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(min(options['workers'], len(buyers)))]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        if failures:
+            raise CommandError(f'Benchmark worker failed: {failures[0]!r}')
+        return recorder.report(elapsed)
+    
+    def buyer_session(self, client, username, rng):
+        response = client.call('login', 'post', reverse('login'), {'username': username, 'password': PASSWORD})
+        if response.status_code != 200:
+            return
+        client.token = response.json()['token']
+        
+        try:
+            deposit = 0
+            for coin in rng.choices(COINS, k=rng.randint(1, 3)):
+                if deposit + coin > MAX_DEPOSIT:
+                    continue
+                response = client.call('deposit', 'post', reverse('deposit'), {'coin': coin})
+                if response.status_code == 200:
+                    deposit = response.json()['current_deposit']
+            
+            response = client.call('products', 'get', reverse('product_list'), {'in_stock': 'true'})
+            affordable = [product for product in response.json() if product['cost'] <= deposit]
+            if affordable:
+                product = rng.choice(affordable)
+                client.call('buy', 'post', reverse('buy'), {'product_id': product['id'], 'amount': 1})
+            
+            client.call('reset', 'post', reverse('reset'))
+        finally:
+            client.call('logout', 'post', reverse('logout'))
+            client.token = None
+    
+    def print_report(self, report):
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_s']:.2f}s "
+            f"({report['throughput_rps']:.1f} req/s) on {report['database']}"
+        )
+        self.stdout.write(f"{'endpoint':<10} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>7}")
+        for endpoint, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<10} {stats['requests']:>8} {stats['errors']:>6} {stats['p50_ms']:>8.2f} "
+                f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['queries_per_request']:>7.1f}"
+            )
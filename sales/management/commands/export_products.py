@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.product_export import EXPORT_CONTENT_TYPES, export_chunks
+
+
+class Command(BaseCommand):
+    help = 'Stream the full product catalog as NDJSON or CSV (same output as GET /api/products/export/).'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_CONTENT_TYPES), help='Defaults to the output file extension, else ndjson')
+        parser.add_argument('--output', help='Write to this file instead of stdout')
+        parser.add_argument('--chunk-size', type=int, help='Rows per fetch (default PRODUCT_EXPORT_CHUNK_SIZE)')
+    
+    def handle(self, *args, **options):
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        
+        path = options['output']
+        export_format = options['format']
+        if export_format is None:
+            extension = os.path.splitext(path)[1].lstrip('.').lower() if path else ''
+            export_format = extension if extension in EXPORT_CONTENT_TYPES else 'ndjson'
+        
+        chunks = export_chunks(export_format, options['chunk_size'])
+        if path is None:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending='')
+            return
+        
+        with open(path, 'wb') as output:
+            for chunk in chunks:
+                output.write(chunk)
@@ -0,0 +1,50 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.models import User
+from sales.product_import import FILE_EXTENSIONS, ImportFormatError, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert a seller's products from a CSV or NDJSON file (same rules as POST /api/products/import/)."
+    
+    def add_arguments(self, parser):
+        parser.add_argument('seller', help='Username of the seller who owns the products')
+        parser.add_argument('path', help="CSV or NDJSON file, or '-' for stdin")
+        parser.add_argument('--format', choices=sorted(set(FILE_EXTENSIONS.values())), help='Defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction (default PRODUCT_IMPORT_CHUNK_SIZE)')
+    
+    def handle(self, *args, **options):
+        try:
+            seller = User.objects.get(username=options['seller'], role='seller')
+        except User.DoesNotExist:
+            raise CommandError(f"No seller named {options['seller']!r}")
+        
+        path = options['path']
+        import_format = options['format'] or FILE_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if import_format is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            result = import_products(seller, read_rows(stream, import_format), options['chunk_size'])
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+        
+        for error in result['errors']:
+            messages = '; '.join(
+                f'{field}: {" ".join(str(message) for message in field_messages)}'
+                for field, field_messages in error['errors'].items()
+            )
+            self.stderr.write(f"line {error['line']}: {messages}")
+        self.stdout.write(
+            f"Created {result['created']}, updated {result['updated']}, unchanged {result['unchanged']}, "
+            f"{len(result['errors'])} error(s)"
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from sales.models import ActiveSession
+
+
+class Command(BaseCommand):
+    help = 'Delete expired login sessions in small batches.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches')
+        parser.add_argument(
+            '--interval', type=float, default=0.0,
+            help='Keep running, sweeping again every INTERVAL seconds (0 = sweep once and exit)',
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        
+        while True:
+            deleted = self.sweep(options['batch_size'], options['pause'])
+            self.stdout.write(f'Deleted {deleted} expired session(s)')
+            if not options['interval']:
+                return
+            # Between sweeps, give the connection back rather than hold it idle.
+            connections.close_all()
+            time.sleep(options['interval'])
+    
+    def sweep(self, batch_size, pause):
+        total = 0
+        while True:
+            # Each batch is its own short autocommit DELETE, so logins and
+            # auth lookups are never blocked behind one large delete.
+            deleted = ActiveSession.objects.reap(batch_size)
+            total += deleted
+            if deleted < batch_size:
+                return total
+            if pause:
+                time.sleep(pause)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.models import Product
+from sales.stock import shard_stock
+
+
+class Command(BaseCommand):
+    help = "Split a hot product's stock across counter rows (0 shards moves it back to amount_available)."
+    
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('shards', type=int, help='Number of stock counter rows, e.g. 8; 0 to unshard')
+    
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if not 0 <= shards <= 256:
+            raise CommandError('shards must be between 0 and 256')
+        
+        try:
+            total = shard_stock(options['product_id'], shards)
+        except Product.DoesNotExist:
+            raise CommandError(f"No product with id {options['product_id']}")
+        
+        if shards:
+            self.stdout.write(f"Product {options['product_id']}: {total} unit(s) across {shards} shard(s)")
+        else:
+            self.stdout.write(f"Product {options['product_id']}: {total} unit(s), unsharded")
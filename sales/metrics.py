@@ -0,0 +1,313 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from .change import DENOMINATIONS
+
+# In-process Prometheus metrics. Everything is preallocated: recording a
+# request is a few list-slot increments under an uncontended lock, so the
+# middleware can stay on in production. Values are per worker process.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def metrics_enabled():
+    return getattr(settings, 'METRICS_ENABLED', True)
+
+
+class Counter:
+    kind = 'counter'
+    
+    def __init__(self, name, documentation, label=None, label_values=(None,)):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.values = dict.fromkeys(label_values, 0)
+        self._lock = threading.Lock()
+    
+    def inc(self, amount=1, label_value=None):
+        with self._lock:
+            self.values[label_value] += amount
+    
+    def reset(self):
+        with self._lock:
+            for key in self.values:
+                self.values[key] = 0
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for label_value, value in self.values.items():
+                labels = f'{{{self.label}="{label_value}"}}' if self.label else ''
+                lines.append(f'{self.name}{labels} {value}')
+        return lines
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+    
+    def dec(self, amount=1, label_value=None):
+        self.inc(-amount, label_value)
+
+
+PURCHASES = Counter('vending_purchases_total', 'Successful purchases (single and batch).')
+ITEMS_SOLD = Counter('vending_items_sold_total', 'Product units sold.')
+INSUFFICIENT_FUNDS = Counter('vending_insufficient_funds_total', 'Purchases refused for insufficient deposit.')
+INSUFFICIENT_STOCK = Counter('vending_insufficient_stock_total', 'Purchases refused for insufficient stock.')
+AUTH_FAILURES = Counter('vending_auth_failures_total', 'Rejected JWT credentials.')
+CHANGE_COINS = Counter(
+    'vending_change_coins_total', 'Coins paid out as change or refunds.',
+    label='coin', label_values=DENOMINATIONS,
+)
+PASSWORD_HASHES_IN_FLIGHT = Gauge(
+    'vending_password_hashes_in_flight', 'Password hashes queued or running on the hashing pool.'
+)
+PASSWORD_HASHES_REJECTED = Counter(
+    'vending_password_hashes_rejected_total', 'Password hashes refused because the hashing pool queue was full.'
+)
+STOCK_REBALANCES = Counter(
+    'vending_stock_rebalances_total', 'Sharded products whose stock was spread over their shards again.'
+)
+BUSINESS_COUNTERS = (
+    PURCHASES, ITEMS_SOLD, INSUFFICIENT_FUNDS, INSUFFICIENT_STOCK, AUTH_FAILURES, CHANGE_COINS,
+    PASSWORD_HASHES_IN_FLIGHT, PASSWORD_HASHES_REJECTED, STOCK_REBALANCES,
+)
+
+
+def record_change(breakdown):
+    for coin, count in breakdown.items():
+        if count:
+            CHANGE_COINS.inc(count, coin)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; cumulated only when rendered.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+    
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+    
+    def render(self, name, route=None):
+        labels = f'route="{route}",' if route is not None else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+        suffix = f'{{route="{route}"}}' if route is not None else ''
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {cumulative}')
+        return lines
+
+
+class LockedHistogram(Histogram):
+    def __init__(self, buckets):
+        super().__init__(buckets)
+        self.lock = threading.Lock()
+    
+    def observe(self, value):
+        with self.lock:
+            super().observe(value)
+
+
+PASSWORD_HASH_WAIT = LockedHistogram(LATENCY_BUCKETS)
+PASSWORD_HASH_DURATION = LockedHistogram(LATENCY_BUCKETS)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db_time = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.responses = [0] * len(STATUS_CLASSES)
+        self.lock = threading.Lock()
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def get_route_metrics(route):
+    metrics = _routes.get(route)
+    if metrics is None:
+        with _routes_lock:
+            metrics = _routes.setdefault(route, RouteMetrics())
+    return metrics
+
+
+def observe_request(route, status_code, seconds, db_seconds, queries):
+    metrics = get_route_metrics(route)
+    with metrics.lock:
+        metrics.latency.observe(seconds)
+        metrics.db_time.observe(db_seconds)
+        metrics.queries.observe(queries)
+        metrics.responses[min(max(status_code // 100, 1), 5) - 1] += 1
+
+
+def reset_metrics():
+    with _routes_lock:
+        _routes.clear()
+    for counter in BUSINESS_COUNTERS:
+        counter.reset()
+    for histogram in (PASSWORD_HASH_WAIT, PASSWORD_HASH_DURATION):
+        with histogram.lock:
+            histogram.counts = [0] * len(histogram.counts)
+            histogram.sum = 0
+
+
+# Query observers for the current request. A context variable rather than
+# per-connection state: asgiref copies the context into sync_to_async
+# threads, so the ORM queries of async views reach the observers their
+# middleware set, although they run on another thread's connection.
+_query_observers = ContextVar('query_observers', default=())
+
+
+class QueryObserver:
+    # Installed once per database connection as a permanent execute wrapper;
+    # with no observers registered it only reads the context variable.
+    __slots__ = ()
+    
+    def __call__(self, execute, sql, params, many, context):
+        observers = _query_observers.get()
+        if not observers:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            for observer in observers:
+                observer(sql, many, start, duration)
+
+
+def install_query_observer(connection):
+    if not getattr(connection, 'query_observer_installed', False):
+        connection.query_observer_installed = True
+        connection.execute_wrappers.insert(0, QueryObserver())
+
+
+@contextmanager
+def observe_queries(observer):
+    # observer(sql, many, start, duration) is called for every query run in
+    # this context, whichever thread runs it.
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield observer
+    finally:
+        _query_observers.reset(token)
+
+
+class QueryStats:
+    __slots__ = ('queries', 'seconds')
+    
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+    
+    def __call__(self, sql, many, start, duration):
+        self.queries += 1
+        self.seconds += duration
+
+
+class MetricsMiddleware:
+    # Sync and async capable, so under ASGI it does not push every request
+    # onto a thread and back (which would undo the native async views).
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = QueryStats()
+        start = time.perf_counter()
+        with observe_queries(stats):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+    
+    async def __acall__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with observe_queries(stats):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+    
+    def record(self, request, response, seconds, stats):
+        match = request.resolver_match
+        route = match.url_name if match is not None and match.url_name else UNMATCHED_ROUTE
+        observe_request(route, response.status_code, seconds, stats.seconds, stats.queries)
+
+
+def render_metrics():
+    lines = []
+    for counter in BUSINESS_COUNTERS:
+        lines.extend(counter.render())
+    
+    for name, documentation, histogram in (
+        ('vending_password_hash_wait_seconds', 'Time password hashes spent queued for the hashing pool.', PASSWORD_HASH_WAIT),
+        ('vending_password_hash_duration_seconds', 'Time spent hashing passwords.', PASSWORD_HASH_DURATION),
+    ):
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} histogram')
+        with histogram.lock:
+            lines.extend(histogram.render(name))
+    
+    with _routes_lock:
+        routes = sorted(_routes.items())
+    
+    families = (
+        ('vending_http_request_duration_seconds', 'histogram', 'Request latency by route.', 'latency'),
+        ('vending_http_db_duration_seconds', 'histogram', 'Time spent in SQL per request by route.', 'db_time'),
+        ('vending_http_db_queries', 'histogram', 'SQL queries per request by route.', 'queries'),
+    )
+    for name, kind, documentation, attribute in families:
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for route, metrics in routes:
+            with metrics.lock:
+                lines.extend(getattr(metrics, attribute).render(name, route))
+    
+    lines.append('# HELP vending_http_responses_total Responses by route and status class.')
+    lines.append('# TYPE vending_http_responses_total counter')
+    for route, metrics in routes:
+        with metrics.lock:
+            for status_class, count in zip(STATUS_CLASSES, metrics.responses):
+                lines.append(f'vending_http_responses_total{{route="{route}",status="{status_class}"}} {count}')
+    
+    return '\n'.join(lines) + '\n'
+
+
+def scrape_authorized(request):
+    # Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>".
+    # Without a token configured every scrape is refused.
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    if not metrics_enabled():
+        raise Http404
+    if not scrape_authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,50 @@
+import logging
+from collections import Counter
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .budgets import get_query_budget
+from .metrics import observe_queries
+
+logger = logging.getLogger('sales.query_budget')
+
+
+class QueryBudgetMiddleware:
+    # Development aid (QUERY_BUDGET_WARNINGS): log every request that runs more
+    # queries than its sales.budgets entry, with the statements it repeated.
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        statements = []
+        with observe_queries(lambda sql, many, start, duration: statements.append(sql)):
+            response = self.get_response(request)
+        self.check(request, statements)
+        return response
+    
+    async def __acall__(self, request):
+        statements = []
+        with observe_queries(lambda sql, many, start, duration: statements.append(sql)):
+            response = await self.get_response(request)
+        self.check(request, statements)
+        return response
+    
+    def check(self, request, statements):
+        match = request.resolver_match
+        if match is None:
+            return
+        
+        budget = get_query_budget(match.url_name, request.method)
+        if budget is not None and len(statements) > budget:
+            duplicates = [(count, sql) for sql, count in Counter(statements).most_common() if count > 1]
+            logger.warning(
+                '%s %s ran %d queries (budget %d)%s',
+                request.method, match.url_name, len(statements), budget,
+                ''.join(f'\n  {count}x {sql}' for count, sql in duplicates),
+            )
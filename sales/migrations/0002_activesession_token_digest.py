@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activesession',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+import hashlib
+
+from django.db import migrations
+
+
+def backfill_token_digest(apps, schema_editor):
+    ActiveSession = apps.get_model('sales', 'ActiveSession')
+    batch = []
+    for session in ActiveSession.objects.filter(token_digest__isnull=True).only('id', 'token').iterator(chunk_size=1000):
+        session.token_digest = hashlib.sha256(session.token.encode()).digest()
+        batch.append(session)
+        if len(batch) >= 1000:
+            ActiveSession.objects.bulk_update(batch, ['token_digest'])
+            batch = []
+    if batch:
+        ActiveSession.objects.bulk_update(batch, ['token_digest'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0002_activesession_token_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_token_digest, migrations.RunPython.noop),
+    ]
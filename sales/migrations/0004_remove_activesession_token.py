@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def clear_sessions(apps, schema_editor):
+    # Raw tokens cannot be recovered from their digests, so rolling back
+    # logs everybody out instead of restoring the old column.
+    ActiveSession = apps.get_model('sales', 'ActiveSession')
+    ActiveSession.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0003_backfill_token_digest'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='activesession',
+            name='active_sess_user_id_91a12e_idx',
+        ),
+        migrations.RemoveField(
+            model_name='activesession',
+            name='token',
+        ),
+        migrations.RunPython(migrations.RunPython.noop, clear_sessions),
+        migrations.AlterField(
+            model_name='activesession',
+            name='token_digest',
+            field=models.BinaryField(max_length=32, unique=True),
+        ),
+    ]
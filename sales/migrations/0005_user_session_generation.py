@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_remove_activesession_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='session_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:47
+
+import sales.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', sales.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('sales', '0007_user_manager'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.CheckConstraint(condition=models.Q(('amount_available__gte', 0)), name='products_amount_available_non_negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.CheckConstraint(condition=models.Q(('deposit__gte', 0)), name='users_deposit_non_negative'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 06:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_non_negative_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoinInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('denomination', models.PositiveIntegerField(unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'coin_inventory',
+                'ordering': ['-denomination'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('count__gte', 0)), name='coin_inventory_count_non_negative')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def seed_denominations(apps, schema_editor):
+    CoinInventory = apps.get_model('sales', 'CoinInventory')
+    for denomination in (5, 10, 20, 50, 100):
+        CoinInventory.objects.get_or_create(denomination=denomination)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_coin_inventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_denominations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicate_sessions(apps, schema_editor):
+    # Keep each user's most recent session; older ones could not be created
+    # under the new constraint.
+    ActiveSession = apps.get_model('sales', 'ActiveSession')
+    latest = ActiveSession.objects.values('user').annotate(latest=Max('id')).values('latest')
+    ActiveSession.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_seed_coin_inventory'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='activesession',
+            constraint=models.UniqueConstraint(fields=('user',), name='active_sessions_one_per_user'),
+        ),
+        migrations.AlterField(
+            model_name='activesession',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='active_sessions', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-17 07:53
+
+from datetime import timedelta
+
+import sales.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_expires_at(apps, schema_editor):
+    # Only token digests are stored, so the tokens' own exp claims cannot be
+    # read back. Derive the expiry from created_at and the longest lifetime a
+    # session token could have had, so no live session is reaped early.
+    ActiveSession = apps.get_model('sales', 'ActiveSession')
+    lifetime = max(timedelta(days=1), timedelta(seconds=getattr(settings, 'JWT_REFRESH_TOKEN_LIFETIME', 86400)))
+    ActiveSession.objects.filter(expires_at__isnull=True).update(expires_at=F('created_at') + lifetime)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_one_session_per_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activesession',
+            name='expires_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_expires_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='activesession',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=sales.models.default_session_expiry),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 08:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_activesession_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['seller', 'product_name'], name='products_seller__f46278_idx'),
+        ),
+    ]
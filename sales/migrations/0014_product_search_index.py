@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from sales.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from sales.search import uninstall_search_index
+    uninstall_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0013_product_seller_name_index'),
+    ]
+
+    operations = [
+        # Backend-specific (pg_trgm GIN index or SQLite FTS5 table and
+        # triggers), so not expressed as model indexes; see sales/search.py.
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 08:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0014_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='sales.product')),
+            ],
+            options={
+                'db_table': 'product_stock_shards',
+                'constraints': [models.UniqueConstraint(fields=('product', 'shard'), name='product_stock_shards_unique'), models.CheckConstraint(condition=models.Q(('count__gte', 0)), name='product_stock_shards_count_non_negative')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def install(apps, schema_editor):
+    from sales.search import install_search_index
+    install_search_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    from sales.search import PREFIX_INDEX
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('sales', '0015_stock_shards'),
+    ]
+
+    operations = [
+        # Adds the PostgreSQL prefix index for one- and two-letter searches
+        # (and rebuilds either search index if an earlier build was left
+        # invalid); see sales/search.py.
+        migrations.RunPython(install, uninstall),
+    ]
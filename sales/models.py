@@ -1,7 +1,79 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser
+import hashlib
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F
+from django.contrib.auth.models import AbstractUser, UserManager as DjangoUserManager
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+
+def _supports_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+# Lost compare-and-swap races on a deposit before falling back to a row lock.
+DEPOSIT_CAS_ATTEMPTS = 3
+
+
+class UserManager(DjangoUserManager):
+    def credit_deposit(self, user_id, amount, limit):
+        # Single conditional UPDATE: concurrent deposits cannot overwrite each
+        # other and the limit is enforced by the database, not a prior read.
+        # Returns the new balance, or None if the limit would be exceeded.
+        if _supports_update_returning():
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET deposit = deposit + %s '
+                    f'WHERE id = %s AND deposit + %s <= %s RETURNING deposit',
+                    [amount, user_id, amount, limit],
+                )
+                row = cursor.fetchone()
+            return row[0] if row else None
+        
+        updated = self.filter(id=user_id, deposit__lte=limit - amount).update(deposit=F('deposit') + amount)
+        if not updated:
+            return None
+        return self.filter(id=user_id).values_list('deposit', flat=True).get()
+    
+    def reset_deposit(self, user_id, expected):
+        # Compare-and-swap against the balance the caller already has, so the
+        # common case is a single UPDATE; retry with a fresh read on conflict.
+        # After DEPOSIT_CAS_ATTEMPTS lost races the row is locked instead, so
+        # a hot account cannot keep a request spinning. Returns the balance
+        # that was cleared.
+        for _ in range(DEPOSIT_CAS_ATTEMPTS):
+            if self.filter(id=user_id, deposit=expected).update(deposit=0):
+                return expected
+            expected = self.filter(id=user_id).values_list('deposit', flat=True).get()
+        
+        with transaction.atomic():
+            expected = self._locked_deposit(user_id)
+            self.filter(id=user_id).update(deposit=0)
+        return expected
+    
+    def take_deposit(self, user_id, expected, minimum):
+        # Like reset_deposit, but gives up (returns None) once the current
+        # balance is below minimum, so a purchase can be refused without a
+        # row lock.
+        for _ in range(DEPOSIT_CAS_ATTEMPTS):
+            if expected >= minimum and self.filter(id=user_id, deposit=expected).update(deposit=0):
+                return expected
+            expected = self.filter(id=user_id).values_list('deposit', flat=True).get()
+            if expected < minimum:
+                return None
+        
+        with transaction.atomic():
+            expected = self._locked_deposit(user_id)
+            if expected < minimum:
+                return None
+            self.filter(id=user_id).update(deposit=0)
+        return expected
+    
+    def _locked_deposit(self, user_id):
+        return self.select_for_update().filter(id=user_id).values_list('deposit', flat=True).get()
 
 
 class User(AbstractUser):
@@ -12,9 +84,15 @@ class User(AbstractUser):
     
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
     deposit = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    session_generation = models.PositiveIntegerField(default=0)
+    
+    objects = UserManager()
     
     class Meta:
         db_table = 'users'
+        constraints = [
+            models.CheckConstraint(condition=models.Q(deposit__gte=0), name='users_deposit_non_negative'),
+        ]
         
     def clean(self):
         if self.deposit > 10000:
@@ -24,15 +102,68 @@ class User(AbstractUser):
         return self.username
 
 
+def token_digest(token):
+    return hashlib.sha256(token.encode()).digest()
+
+
+def default_session_expiry():
+    # Sessions created outside login (admin, fixtures) last as long as a login token.
+    from .authentication import session_lifetime
+    return timezone.now() + session_lifetime()
+
+
+class ActiveSessionManager(models.Manager):
+    def start(self, user, digest, expires_at):
+        # One session per user is a unique constraint, so the insert itself is
+        # the existence check and concurrent logins cannot both succeed. An
+        # expired session that the reaper has not removed yet is replaced.
+        # Returns False if the user already has a live session.
+        now = timezone.now()
+        if _supports_update_returning():
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, token_digest, created_at, expires_at) VALUES (%s, %s, %s, %s) '
+                    f'ON CONFLICT (user_id) DO UPDATE SET token_digest = EXCLUDED.token_digest, '
+                    f'created_at = EXCLUDED.created_at, expires_at = EXCLUDED.expires_at '
+                    f'WHERE {table}.expires_at <= EXCLUDED.created_at RETURNING id',
+                    [
+                        user.id, digest,
+                        connection.ops.adapt_datetimefield_value(now),
+                        connection.ops.adapt_datetimefield_value(expires_at),
+                    ],
+                )
+                return cursor.fetchone() is not None
+        
+        try:
+            with transaction.atomic():
+                self.filter(user=user, expires_at__lte=now).delete()
+                self.create(user=user, token_digest=digest, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        return True
+    
+    def reap(self, batch_size=1000, now=None):
+        # Deletes at most batch_size expired sessions by primary key, so each
+        # call is a short transaction. Returns the number deleted.
+        expired = self.filter(expires_at__lte=now or timezone.now()).values_list('id', flat=True)[:batch_size]
+        deleted, _ = self.filter(id__in=list(expired)).delete()
+        return deleted
+
+
 class ActiveSession(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='active_sessions')
-    token = models.CharField(max_length=500, unique=True)
+    # The unique constraint below doubles as the index on user_id.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='active_sessions', db_index=False)
+    token_digest = models.BinaryField(max_length=32, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(default=default_session_expiry, db_index=True)
+    
+    objects = ActiveSessionManager()
     
     class Meta:
         db_table = 'active_sessions'
-        indexes = [
-            models.Index(fields=['user', 'token']),
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='active_sessions_one_per_user'),
         ]
     
     def __str__(self):
@@ -44,13 +175,31 @@ class Product(models.Model):
     amount_available = models.IntegerField(validators=[MinValueValidator(0)])
     cost = models.IntegerField(validators=[MinValueValidator(5)])
     seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products')
+    # 0: stock is amount_available. Otherwise it lives in this many StockShard
+    # rows and amount_available is the total as of the last rebalance (see
+    # stock.py); set it with manage.py shard_stock.
+    stock_shards = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'products'
         indexes = [
-            models.Index(fields=['seller']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['seller', 'created_at', 'id']),
+            models.Index(fields=['seller', 'product_name']),
+            models.Index(fields=['cost']),
+            models.Index(
+                fields=['created_at', 'id'],
+                condition=models.Q(amount_available__gt=0),
+                name='products_in_stock_idx',
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(amount_available__gte=0),
+                name='products_amount_available_non_negative',
+            ),
         ]
     
     def clean(self):
@@ -58,4 +207,36 @@ class Product(models.Model):
             raise ValidationError({'cost': 'Cost must be in multiples of 5'})
     
     def __str__(self):
-        return self.product_name
\ No newline at end of file
+        return self.product_name
+
+
+class StockShard(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards', db_index=False)
+    shard = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'product_stock_shards'
+        constraints = [
+            # Also the index for per-product lookups.
+            models.UniqueConstraint(fields=['product', 'shard'], name='product_stock_shards_unique'),
+            models.CheckConstraint(condition=models.Q(count__gte=0), name='product_stock_shards_count_non_negative'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} #{self.shard} x {self.count}"
+
+
+class CoinInventory(models.Model):
+    denomination = models.PositiveIntegerField(unique=True)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'coin_inventory'
+        ordering = ['-denomination']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(count__gte=0), name='coin_inventory_count_non_negative'),
+        ]
+    
+    def __str__(self):
+        return f"{self.denomination}c x {self.count}"
\ No newline at end of file
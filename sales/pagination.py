@@ -0,0 +1,67 @@
+import base64
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlencode
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    raw = f'{created_at.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if created_at is None:
+        raise InvalidCursor(cursor)
+    return created_at, pk
+
+
+def get_page_size(requested=None):
+    default = getattr(settings, 'PRODUCT_LIST_PAGE_SIZE', 100)
+    maximum = getattr(settings, 'PRODUCT_LIST_MAX_PAGE_SIZE', 1000)
+    if not requested:
+        return default
+    return min(requested, maximum)
+
+
+def keyset_queryset(queryset, cursor=None, page_size=None):
+    # Seek past the last (created_at, id) pair instead of using OFFSET, so
+    # every page is a bounded index range scan and no COUNT(*) is needed.
+    queryset = queryset.order_by('created_at', 'id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk))
+    
+    page_size = get_page_size(page_size)
+    return queryset[:page_size + 1], page_size
+
+
+def keyset_page(rows, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def paginate_keyset(queryset, cursor=None, page_size=None):
+    queryset, page_size = keyset_queryset(queryset, cursor, page_size)
+    return keyset_page(list(queryset), page_size)
+
+
+def next_page_link(request, next_cursor):
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    url = request.build_absolute_uri(request.path)
+    return f'<{url}?{urlencode(params, doseq=True)}>; rel="next"'
@@ -0,0 +1,65 @@
+import csv
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .models import Product
+from .renderers import orjson
+from .serializers import datetime_representation, product_rows, serialize_product_row
+
+# Full catalog dumps for reconciliation jobs. Rows come off a server-side
+# cursor (QuerySet.iterator) as values_list tuples and are encoded a chunk at
+# a time, so memory stays flat however large the catalog is.
+
+EXPORT_COLUMNS = (
+    'id', 'product_name', 'amount_available', 'cost', 'seller_id', 'seller_username', 'created_at', 'updated_at'
+)
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+_dumps = orjson.dumps if orjson is not None else (lambda data: json.dumps(data, separators=(',', ':')).encode())
+
+
+class _Lines:
+    # csv.writer target that hands back each encoded line instead of storing it.
+    def write(self, value):
+        return value
+
+
+def export_chunk_size():
+    return getattr(settings, 'PRODUCT_EXPORT_CHUNK_SIZE', 2000)
+
+
+def export_rows(chunk_size):
+    return product_rows(Product.objects.order_by('id')).iterator(chunk_size=chunk_size)
+
+
+def export_chunks(export_format, chunk_size=None):
+    # Yields one bytes object per chunk_size rows.
+    chunk_size = chunk_size or export_chunk_size()
+    datetime_repr = datetime_representation()
+    writer = csv.writer(_Lines()) if export_format == 'csv' else None
+    if writer is not None:
+        yield writer.writerow(EXPORT_COLUMNS).encode()
+    
+    lines = []
+    for row in export_rows(chunk_size):
+        data = serialize_product_row(row, datetime_repr)
+        if writer is not None:
+            lines.append(writer.writerow(data.values()).encode())
+        else:
+            lines.append(_dumps(data) + b'\n')
+        if len(lines) >= chunk_size:
+            yield b''.join(lines)
+            lines = []
+    if lines:
+        yield b''.join(lines)
+
+
+async def aiter_chunks(chunks):
+    # Under ASGI, Django would drain a sync iterator into memory before
+    # sending it; step it from a worker thread one chunk at a time instead.
+    step = sync_to_async(next)
+    while (chunk := await step(chunks, None)) is not None:
+        yield chunk
@@ -0,0 +1,173 @@
+import csv
+import json
+from itertools import islice
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from .catalog import bump_catalog_version
+from .models import Product
+from .renderers import orjson
+from .serializers import ProductImportRowSerializer
+from .stock import rebalance_stock, stock_totals
+
+# Bulk product upserts for sellers, keyed by (seller, product_name). Input is
+# read a line at a time and written one chunk per transaction, so memory is
+# bounded by the chunk size and a bad row or a failed chunk never rolls back
+# the chunks already saved.
+
+IMPORT_FIELDS = ('product_name', 'amount_available', 'cost')
+IMPORT_CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+}
+FILE_EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+_loads = orjson.loads if orjson is not None else json.loads
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+def row_error(message):
+    return {'non_field_errors': [message]}
+
+
+def csv_rows(lines):
+    bad_lines = set()
+    
+    def decoded():
+        # utf-8-sig drops the byte order mark spreadsheet exports start with.
+        for number, line in enumerate(lines, 1):
+            try:
+                yield line.decode('utf-8-sig')
+            except UnicodeDecodeError:
+                bad_lines.add(number)
+                yield line.decode('utf-8-sig', 'replace')
+    
+    reader = csv.DictReader(decoded())
+    try:
+        fieldnames = reader.fieldnames or ()
+    except csv.Error as exc:
+        raise ImportFormatError(f'CSV header is not valid: {exc}')
+    missing = [field for field in IMPORT_FIELDS if field not in fieldnames]
+    if missing:
+        raise ImportFormatError(f'CSV header is missing: {", ".join(missing)}')
+    
+    last_line = reader.line_num
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as exc:
+            # E.g. a field over csv.field_size_limit(). The reader carries on
+            # with the next line, so only this row is lost.
+            row, errors = None, row_error(f'Invalid CSV: {exc}')
+        else:
+            errors = None
+        # A quoted field can span lines; report the row by its first line.
+        first_line, last_line = last_line + 1, reader.line_num
+        if errors is None and bad_lines and any(number in bad_lines for number in range(first_line, last_line + 1)):
+            errors = row_error('Row is not valid UTF-8')
+        yield first_line, row if errors is None else None, errors
+
+
+def ndjson_rows(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = _loads(line)
+        except ValueError:
+            yield number, None, row_error('Invalid JSON')
+            continue
+        if not isinstance(row, dict):
+            yield number, None, row_error('Expected a JSON object')
+            continue
+        yield number, row, None
+
+
+def read_rows(lines, import_format):
+    # lines: any iterable of bytes lines (an uploaded request, an open file).
+    # Yields (line_number, row, errors) with exactly one of row/errors set.
+    if import_format == 'csv':
+        return csv_rows(lines)
+    return ndjson_rows(lines)
+
+
+def validated_rows(rows):
+    serializer = ProductImportRowSerializer()
+    for number, row, errors in rows:
+        if errors is None:
+            try:
+                row = serializer.run_validation(row)
+            except ValidationError as exc:
+                row, errors = None, exc.detail
+        yield number, row, errors
+
+
+def save_chunk(seller, rows):
+    # rows: product_name -> validated row. Returns (created, updated, unchanged).
+    now = timezone.now()
+    with transaction.atomic():
+        existing = list(Product.objects.filter(seller=seller, product_name__in=list(rows)).only(
+            'id', 'product_name', 'amount_available', 'cost', 'stock_shards'
+        ))
+        stock = stock_totals(existing)
+        changed = []
+        found = set()
+        for product in existing:
+            row = rows[product.product_name]
+            found.add(product.product_name)
+            if (stock[product.id], product.cost) != (row['amount_available'], row['cost']):
+                product.amount_available = row['amount_available']
+                product.cost = row['cost']
+                product.updated_at = now
+                changed.append(product)
+        
+        new = [Product(seller=seller, **row) for name, row in rows.items() if name not in found]
+        if changed:
+            Product.objects.bulk_update(changed, ['amount_available', 'cost', 'updated_at'])
+            for product in changed:
+                if product.stock_shards:
+                    rebalance_stock(product.id, product.amount_available)
+        if new:
+            Product.objects.bulk_create(new)
+        if changed or new:
+            # Bulk writes send no post_save signals.
+            bump_catalog_version()
+    return len(new), len(changed), len(found) - len(changed)
+
+
+def import_products(seller, rows, chunk_size=None):
+    chunk_size = chunk_size or getattr(settings, 'PRODUCT_IMPORT_CHUNK_SIZE', 500)
+    result = {'created': 0, 'updated': 0, 'unchanged': 0, 'errors': []}
+    rows = validated_rows(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        valid = {}
+        lines = {}
+        for number, row, errors in chunk:
+            if errors is not None:
+                result['errors'].append({'line': number, 'errors': errors})
+            else:
+                # A name repeated within the chunk: the last row wins.
+                valid[row['product_name']] = row
+                lines[row['product_name']] = number
+        if not valid:
+            continue
+        
+        try:
+            created, updated, unchanged = save_chunk(seller, valid)
+        except DatabaseError as exc:
+            error = row_error(f'Not saved: {exc}')
+            result['errors'].extend({'line': number, 'errors': error} for number in lines.values())
+            continue
+        result['created'] += created
+        result['updated'] += updated
+        result['unchanged'] += unchanged
+    
+    result['errors'].sort(key=lambda error: error['line'])
+    return result
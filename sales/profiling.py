@@ -0,0 +1,193 @@
+import cProfile
+import itertools
+import json
+import os
+import tempfile
+import time
+import uuid
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from .authentication import JWTAuthentication
+from .metrics import observe_queries
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = 'profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILING_DIR', None) or os.path.join(tempfile.gettempdir(), 'vending_machine_profiles')
+
+
+def prune_profiles(directory, keep):
+    # Deletes all but the newest `keep` profiles (both files of each).
+    profiles = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            profile_id, extension = os.path.splitext(entry.name)
+            if extension not in ('.prof', '.json'):
+                continue
+            try:
+                modified = entry.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            profiles[profile_id] = max(profiles.get(profile_id, 0), modified)
+    for profile_id in sorted(profiles, key=profiles.get, reverse=True)[keep:]:
+        for extension in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(directory, profile_id + extension))
+            except FileNotFoundError:
+                pass
+
+
+def is_staff_request(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    # API clients authenticate per view with JWTAuthentication, which has not
+    # run yet; repeat it here (a principal cache hit) only when asked to profile.
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+async def ais_staff_request(request):
+    auser = getattr(request, 'auser', None)
+    if auser is not None:
+        user = await auser()
+        if user.is_authenticated and user.is_staff:
+            return True
+    try:
+        result = await JWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+class SQLTimeline:
+    def __init__(self, start):
+        self.start = start
+        self.queries = []
+    
+    def __call__(self, sql, many, started, duration):
+        self.queries.append({
+            'start_ms': (started - self.start) * 1000,
+            'duration_ms': duration * 1000,
+            'sql': sql,
+            'many': many,
+        })
+
+
+class ProfilingMiddleware:
+    # Only installed when PROFILING_ENABLED is set, so it costs nothing
+    # otherwise. Staff can profile a request with "X-Profile: 1" or
+    # "?profile=1"; PROFILING_SAMPLE_RATE=N also profiles every Nth request.
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.counter = itertools.count(1)
+        self.profiling = False
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        reason = self.profile_reason(request)
+        if reason is None:
+            return self.get_response(request)
+        
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        timeline = SQLTimeline(start)
+        with observe_queries(timeline):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        elapsed = time.perf_counter() - start
+        
+        profile_id = self.save(request, response, reason, profiler, timeline, elapsed)
+        response[PROFILE_ID_HEADER] = profile_id
+        return response
+    
+    async def __acall__(self, request):
+        # cProfile follows one thread, and under ASGI that is the event loop
+        # every request shares: profile one request at a time, and expect its
+        # stats to include whatever else the loop ran meanwhile. The SQL
+        # timeline is exact, including queries run on sync_to_async threads.
+        reason = None if self.profiling else await self.aprofile_reason(request)
+        # Checked again: another request may have started profiling meanwhile.
+        if reason is None or self.profiling:
+            return await self.get_response(request)
+        
+        self.profiling = True
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        timeline = SQLTimeline(start)
+        try:
+            with observe_queries(timeline):
+                profiler.enable()
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            self.profiling = False
+        elapsed = time.perf_counter() - start
+        
+        profile_id = await sync_to_async(self.save)(request, response, reason, profiler, timeline, elapsed)
+        response[PROFILE_ID_HEADER] = profile_id
+        return response
+    
+    def profile_reason(self, request):
+        sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if sample_rate and next(self.counter) % sample_rate == 0:
+            return 'sampled'
+        
+        requested = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_QUERY_PARAM)
+        if requested and requested not in ('0', 'false') and is_staff_request(request):
+            return 'requested'
+        return None
+    
+    async def aprofile_reason(self, request):
+        sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        if sample_rate and next(self.counter) % sample_rate == 0:
+            return 'sampled'
+        
+        requested = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_QUERY_PARAM)
+        if requested and requested not in ('0', 'false') and await ais_staff_request(request):
+            return 'requested'
+        return None
+    
+    def save(self, request, response, reason, profiler, timeline, elapsed):
+        profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:12]}'
+        directory = profile_dir()
+        os.makedirs(directory, exist_ok=True)
+        
+        profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+        match = request.resolver_match
+        with open(os.path.join(directory, f'{profile_id}.json'), 'w') as output:
+            json.dump({
+                'id': profile_id,
+                'reason': reason,
+                'method': request.method,
+                'path': request.path,
+                'route': match.url_name if match is not None else None,
+                'status': response.status_code,
+                'duration_ms': elapsed * 1000,
+                'sql_time_ms': sum(query['duration_ms'] for query in timeline.queries),
+                'queries': timeline.queries,
+            }, output, indent=2)
+        
+        keep = getattr(settings, 'PROFILING_MAX_PROFILES', 100)
+        if keep:
+            prune_profiles(directory, keep)
+        return profile_id
@@ -0,0 +1,39 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Drop-in JSONRenderer backed by orjson when it is installed. Anything
+    # orjson does not handle natively (datetimes, lazy strings, Decimals, ...)
+    # goes through DRF's own JSONEncoder.default, so output is unchanged,
+    # with one exception: NaN and infinite floats render as null, where DRF's
+    # strict renderer raises ValueError. The API carries no floats (money is
+    # integer cents), and scanning every response for them would cost more
+    # than orjson saves. Pretty-printed, ASCII-only or non-compact output,
+    # and anything orjson refuses (e.g. integers over 64 bits), falls back to
+    # the stdlib path.
+    if orjson is not None:
+        orjson_options = (
+            orjson.OPT_NON_STR_KEYS
+            | orjson.OPT_PASSTHROUGH_DATETIME
+            | orjson.OPT_PASSTHROUGH_DATACLASS
+        )
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.orjson_options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        
+        # Keep the stdlib renderer's escaping of U+2028/U+2029.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -42,7 +42,7 @@ register_schema = extend_schema(
 
 login_schema = extend_schema(
     summary="Login user",
-    description="Authenticate user and receive JWT token. Only one active session per user is allowed.",
+    description="Authenticate user and receive JWT token. Only one active session per user is allowed. When JWT_REFRESH_TOKENS_ENABLED is on, a short-lived access token is returned together with a refresh_token.",
     request={
         'application/json': {
             'example': {
@@ -80,6 +80,30 @@ login_schema = extend_schema(
 )
 
 
+token_refresh_schema = extend_schema(
+    summary="Refresh access token",
+    description="Exchange a refresh token for a new short-lived access token. Only available when JWT_REFRESH_TOKENS_ENABLED is on.",
+    request={
+        'application/json': {
+            'example': {
+                'refresh_token': 'eyJ0eXAiOiJKV1QiLCJhbGc...'
+            }
+        }
+    },
+    responses={
+        200: {
+            'description': 'New access token issued',
+            'example': {'token': 'eyJ0eXAiOiJKV1QiLCJhbGc...'}
+        },
+        401: {
+            'description': 'Refresh token expired or session revoked',
+            'example': {'error': 'Session is no longer active'}
+        }
+    },
+    tags=['Authentication']
+)
+
+
 logout_schema = extend_schema(
     summary="Logout current session",
     description="Terminate the current active session.",
@@ -133,7 +157,16 @@ force_logout_all_schema = extend_schema(
 
 product_list_schema = extend_schema(
     summary="List all products or create new product",
-    description="GET: Retrieve all products (any authenticated user). POST: Create new product (seller only).",
+    description="GET: Retrieve products ordered by creation time (any authenticated user), one page at a time. When more rows exist, the next page's cursor is returned in the X-Next-Cursor and Link headers. POST: Create new product (seller only).",
+    parameters=[
+        OpenApiParameter('cursor', OpenApiTypes.STR, description='Opaque cursor from the X-Next-Cursor header of the previous page'),
+        OpenApiParameter('page_size', OpenApiTypes.INT, description='Number of products per page (capped by PRODUCT_LIST_MAX_PAGE_SIZE)'),
+        OpenApiParameter('seller_id', OpenApiTypes.INT, description='Only products of this seller'),
+        OpenApiParameter('min_cost', OpenApiTypes.INT, description='Minimum cost in cents'),
+        OpenApiParameter('max_cost', OpenApiTypes.INT, description='Maximum cost in cents'),
+        OpenApiParameter('in_stock', OpenApiTypes.BOOL, description='Only products with amount_available > 0'),
+        OpenApiParameter('q', OpenApiTypes.STR, description='Search product names: every word must start a word of the name (typeahead prefix match). Results are ordered by relevance and returned as a single page of page_size; cannot be combined with cursor'),
+    ],
     request={
         'application/json': {
             'example': {
@@ -172,6 +205,9 @@ product_list_schema = extend_schema(
                 'updated_at': '2025-10-30T10:00:00Z'
             }
         },
+        304: {
+            'description': 'Catalog unchanged since the ETag sent in If-None-Match'
+        },
         403: {
             'description': 'Only sellers can create products',
             'example': {'error': 'Only sellers can create products'}
@@ -181,6 +217,58 @@ product_list_schema = extend_schema(
 )
 
 
+product_import_schema = extend_schema(
+    summary="Bulk import products (seller only)",
+    description="Upsert the seller's products by product_name from a CSV (text/csv, header product_name,amount_available,cost) or NDJSON (application/x-ndjson, one object per line) body. Rows are validated like POST /products/ and saved in chunks of PRODUCT_IMPORT_CHUNK_SIZE, each in its own transaction; invalid rows are reported by line number without rolling back the rest.",
+    request={
+        'text/csv': {
+            'example': 'product_name,amount_available,cost\nCoca Cola,20,50\nPepsi,15,45\n'
+        },
+        'application/x-ndjson': {
+            'example': '{"product_name": "Coca Cola", "amount_available": 20, "cost": 50}\n'
+        }
+    },
+    responses={
+        200: {
+            'description': 'Import finished',
+            'example': {
+                'created': 1,
+                'updated': 1,
+                'unchanged': 0,
+                'errors': [
+                    {'line': 4, 'errors': {'cost': ['Cost must be in multiples of 5']}}
+                ]
+            }
+        },
+        400: {'description': 'CSV header is missing required columns'},
+        403: {'description': 'Forbidden - sellers only'},
+        415: {'description': 'Unsupported content type'}
+    },
+    tags=['Products']
+)
+
+
+product_export_schema = extend_schema(
+    summary="Export the full catalog",
+    description="Stream every product, ordered by id, as NDJSON (default) or CSV. Rows are read through a server-side cursor and sent in chunks of PRODUCT_EXPORT_CHUNK_SIZE, so the response starts immediately and server memory does not grow with the catalog.",
+    parameters=[
+        OpenApiParameter('output', OpenApiTypes.STR, enum=['ndjson', 'csv'], description='Output format (default ndjson)'),
+    ],
+    responses={
+        (200, 'application/x-ndjson'): {
+            'description': 'One product object per line',
+            'example': '{"id":1,"product_name":"Coca Cola","amount_available":20,"cost":50,"seller_id":1,"seller_username":"seller1","created_at":"2025-10-30T10:00:00Z","updated_at":"2025-10-30T10:00:00Z"}\n'
+        },
+        (200, 'text/csv'): {
+            'description': 'Header row plus one row per product',
+            'example': 'id,product_name,amount_available,cost,seller_id,seller_username,created_at,updated_at\r\n'
+        },
+        400: {'description': 'Unknown output format'}
+    },
+    tags=['Products']
+)
+
+
 product_detail_schema = extend_schema(
     summary="Get, update or delete a product",
     description="GET: Any authenticated user. PUT/DELETE: Only the seller who created the product.",
@@ -313,6 +401,10 @@ buy_schema = extend_schema(
                 'insufficient_stock': {
                     'summary': 'Out of stock',
                     'value': {'error': 'Insufficient product stock'}
+                },
+                'change_unavailable': {
+                    'summary': 'Machine cannot make change (TRACK_COIN_INVENTORY)',
+                    'value': {'error': 'The machine cannot return change for this purchase'}
                 }
             }
         },
@@ -329,6 +421,57 @@ buy_schema = extend_schema(
 )
 
 
+buy_batch_schema = extend_schema(
+    summary="Buy several products at once",
+    description="Purchase a list of products in a single transaction. Either every item is bought or none is. Repeated product ids are merged. Deposit is reset to 0 after purchase and a single change breakdown is returned.",
+    request={
+        'application/json': {
+            'example': {
+                'items': [
+                    {'product_id': 1, 'amount': 2},
+                    {'product_id': 3, 'amount': 1}
+                ]
+            }
+        }
+    },
+    responses={
+        200: {
+            'description': 'Purchase successful',
+            'example': {
+                'total_spent': 145,
+                'products_purchased': [
+                    {'product_id': 1, 'product_name': 'Coca Cola', 'amount_purchased': 2, 'cost': 50},
+                    {'product_id': 3, 'product_name': 'Chips', 'amount_purchased': 1, 'cost': 45}
+                ],
+                'change': [50, 5]
+            }
+        },
+        400: {
+            'description': 'Insufficient funds or stock',
+            'examples': {
+                'insufficient_funds': {
+                    'summary': 'Insufficient balance',
+                    'value': {'error': 'You have insufficient fund for this purchase'}
+                },
+                'insufficient_stock': {
+                    'summary': 'Out of stock',
+                    'value': {'error': 'Insufficient product stock', 'product_ids': [3]}
+                }
+            }
+        },
+        404: {
+            'description': 'One or more products not found',
+            'example': {'error': 'Product not found', 'product_ids': [9]}
+        },
+        403: {
+            'description': 'Only buyers can purchase',
+            'example': {'detail': 'You do not have permission to perform this action.'}
+        }
+    },
+    tags=['Buyer Operations']
+)
+
+
 reset_schema = extend_schema(
     summary="Reset deposit",
     description="Reset your deposit balance back to 0. Useful when you want to get your money back without making a purchase.",
@@ -0,0 +1,158 @@
+import re
+import sqlite3
+from functools import cache
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Collate, Lower
+from .pagination import get_page_size
+
+# ?q= product-name search for typeahead: every word of the query must match
+# the start of a word in the name, best matches first.
+#
+# PostgreSQL: pg_trgm GIN index on product_name; words are matched with
+# word-start regexes (which the index serves) and ranked by trigram word
+# similarity. Terms of one or two letters have no trigram, so a query made
+# only of those matches the name's leading word instead, through a btree on
+# lower(product_name) in C collation, and reads one page in index order.
+# SQLite: an external-content FTS5 table kept in sync by triggers, queried
+# with prefix terms and ranked by bm25. Elsewhere, or when SQLite lacks FTS5,
+# it falls back to unindexed icontains.
+#
+# On SQLite, migrations that rebuild the products table drop its triggers;
+# install_search_index() runs again after every migrate (see signals.py) and
+# restores them.
+
+FTS_TABLE = 'products_fts'
+TRIGRAM_INDEX = 'products_name_trgm_idx'
+PREFIX_INDEX = 'products_name_prefix_idx'
+MIN_TRIGRAM_TERM = 3
+MAX_TERMS = 8
+# Letters and digits only, the same split as FTS5's unicode61 tokenizer.
+TERM_RE = re.compile(r'[^\W_]+')
+
+
+@cache
+def sqlite_has_fts5():
+    probe = sqlite3.connect(':memory:')
+    try:
+        probe.execute('CREATE VIRTUAL TABLE probe USING fts5(name)')
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def search_terms(query):
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def _sqlite_statements(table):
+    fts = FTS_TABLE
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(product_name, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts}(rowid, product_name) VALUES (new.id, new.product_name); END',
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, product_name) VALUES ('delete', old.id, old.product_name); END",
+        f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF product_name ON {table} BEGIN '
+        f"INSERT INTO {fts}({fts}, rowid, product_name) VALUES ('delete', old.id, old.product_name); "
+        f'INSERT INTO {fts}(rowid, product_name) VALUES (new.id, new.product_name); END',
+    ]
+
+
+def _postgresql_indexes(table):
+    return {
+        TRIGRAM_INDEX: f'{table} USING gin (product_name gin_trgm_ops)',
+        PREFIX_INDEX: f'{table} ((lower(product_name) COLLATE "C"))',
+    }
+
+
+def install_search_index(connection):
+    # Idempotent: safe to run after every migration.
+    table = 'products'
+    if connection.vendor == 'postgresql':
+        # Outside a transaction (migration 0016, post_migrate) the indexes are
+        # built CONCURRENTLY, so writes to products carry on meanwhile.
+        concurrently = '' if connection.in_atomic_block else ' CONCURRENTLY'
+        indexes = _postgresql_indexes(table)
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            # An interrupted concurrent build leaves an invalid index that
+            # IF NOT EXISTS would keep.
+            cursor.execute(
+                'SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE NOT i.indisvalid AND c.relname = ANY(%s)',
+                [list(indexes)],
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'DROP INDEX{concurrently} IF EXISTS {name}')
+            for name, definition in indexes.items():
+                cursor.execute(f'CREATE INDEX{concurrently} IF NOT EXISTS {name} ON {definition}')
+    elif connection.vendor == 'sqlite' and sqlite_has_fts5():
+        with connection.cursor() as cursor:
+            if table not in connection.introspection.table_names(cursor):
+                return
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name LIKE %s",
+                [table, f'{FTS_TABLE}_%'],
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            for statement in _sqlite_statements(table):
+                cursor.execute(statement)
+            # New table or lost triggers: reindex every name.
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall_search_index(connection):
+    if connection.vendor == 'postgresql':
+        concurrently = '' if connection.in_atomic_block else ' CONCURRENTLY'
+        with connection.cursor() as cursor:
+            for name in _postgresql_indexes('products'):
+                cursor.execute(f'DROP INDEX{concurrently} IF EXISTS {name}')
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for suffix in ('insert', 'delete', 'update'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def search_queryset(queryset, query, page_size=None):
+    # The top page_size matches for query; relevance order has no stable
+    # keyset, so search results are a single page.
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        
+        for term in terms:
+            queryset = queryset.filter(product_name__iregex=rf'\m{term}')
+        if all(len(term) < MIN_TRIGRAM_TERM for term in terms):
+            # No trigrams to look up: take the names starting with the first
+            # term, as a range on the prefix index (C collation compares code
+            # points), in index order so the scan stops after one page.
+            prefix = terms[0]
+            queryset = queryset.alias(name_key=Collate(Lower('product_name'), 'C')).filter(
+                name_key__gte=prefix, name_key__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            ).order_by('name_key', 'id')
+        else:
+            queryset = queryset.order_by(TrigramWordSimilarity(' '.join(terms), 'product_name').desc(), 'id')
+    elif connection.vendor == 'sqlite' and sqlite_has_fts5():
+        # FTS5 is joined in, so the view's filters apply in the same query
+        # and bm25 (its rank column) picks the top page among the matches
+        # that pass them.
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[' '.join(f'"{term}"*' for term in terms)],
+            order_by=[f'{FTS_TABLE}.rank', 'id'],
+        )
+    else:
+        queryset = queryset.filter(Q(*(Q(product_name__icontains=term) for term in terms))).order_by('id')
+    return queryset[:get_page_size(page_size)]
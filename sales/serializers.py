@@ -1,11 +1,15 @@
-from rest_framework import serializers
+from datetime import datetime
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from .models import User, Product
+from .stock import rebalance_stock, stock_expression, stock_totals
 
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
-
+    
     
     class Meta:
         model = User
@@ -13,19 +17,42 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['deposit']
     
     def create(self, validated_data):
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            password=validated_data['password'],
+        # Views hash on the password hashing pool and pass the result in.
+        password_hash = validated_data.get('password_hash')
+        if password_hash is None:
+            return User.objects.create_user(
+                username=validated_data['username'],
+                password=validated_data['password'],
+                role=validated_data['role'],
+            )
+        return User.objects.create(
+            username=User.normalize_username(validated_data['username']),
+            password=password_hash,
             role=validated_data['role'],
         )
-        return user
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh_token = serializers.CharField()
+
+
+class ProductRulesMixin:
+    def validate_cost(self, value):
+        if value % 5 != 0:
+            raise serializers.ValidationError("Cost must be in multiples of 5")
+        return value
+    
+    def validate_amount_available(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Amount available cannot be negative")
+        return value
+
+
+class ProductSerializer(ProductRulesMixin, serializers.ModelSerializer):
     seller_id = serializers.IntegerField(source='seller.id', read_only=True)
     seller_username = serializers.CharField(source='seller.username', read_only=True)
     
@@ -34,15 +61,97 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = ['id', 'product_name', 'amount_available', 'cost', 'seller_id', 'seller_username', 'created_at', 'updated_at']
         read_only_fields = ['seller_id', 'seller_username', 'created_at', 'updated_at']
     
-    def validate_cost(self, value):
-        if value % 5 != 0:
-            raise serializers.ValidationError("Cost must be in multiples of 5")
-        return value
+    def update(self, instance, validated_data):
+        if not instance.stock_shards or 'amount_available' not in validated_data:
+            return super().update(instance, validated_data)
+        # A restock of a sharded product is spread over its shards.
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            rebalance_stock(instance.id, validated_data['amount_available'])
+        return instance
     
-    def validate_amount_available(self, value):
-        if value < 0:
-            raise serializers.ValidationError("Amount available cannot be negative")
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if instance.stock_shards:
+            data['amount_available'] = stock_totals([instance])[instance.id]
+        return data
+
+
+class ProductImportRowSerializer(ProductRulesMixin, serializers.Serializer):
+    # The writable ProductSerializer fields with the same model-derived limits,
+    # without the ModelSerializer setup cost: one instance validates every row.
+    product_name = serializers.CharField(max_length=255)
+    amount_available = serializers.IntegerField(min_value=0)
+    cost = serializers.IntegerField(min_value=5)
+
+
+PRODUCT_ROW_FIELDS = (
+    'id', 'product_name', 'stock', 'cost', 'seller_id', 'seller__username', 'created_at', 'updated_at'
+)
+
+
+def product_rows(queryset):
+    # stock is amount_available, or the shard total for sharded products.
+    return queryset.annotate(stock=stock_expression()).values_list(*PRODUCT_ROW_FIELDS, named=True)
+
+
+def datetime_representation():
+    # Same output as DateTimeField.to_representation, with the format and
+    # timezone lookups hoisted out of the per-value path.
+    field = serializers.DateTimeField()
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+    
+    def to_representation(value):
+        if not isinstance(value, datetime) or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
         return value
+    
+    return to_representation
+
+
+def serialize_product_row(row, datetime_repr=None):
+    if datetime_repr is None:
+        datetime_repr = datetime_representation()
+    return {
+        'id': row.id,
+        'product_name': row.product_name,
+        'amount_available': row.stock,
+        'cost': row.cost,
+        'seller_id': row.seller_id,
+        'seller_username': row.seller__username,
+        'created_at': datetime_repr(row.created_at),
+        'updated_at': datetime_repr(row.updated_at),
+    }
+
+
+def serialize_product_rows(rows):
+    # Read-only equivalent of ProductSerializer(many=True).data built from
+    # product_rows() tuples: no model instances, no per-field dispatch.
+    datetime_repr = datetime_representation()
+    return [serialize_product_row(row, datetime_repr) for row in rows]
+
+
+class ProductListQuerySerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1)
+    seller_id = serializers.IntegerField(required=False)
+    min_cost = serializers.IntegerField(required=False, min_value=0)
+    max_cost = serializers.IntegerField(required=False, min_value=0)
+    in_stock = serializers.BooleanField(required=False, default=False)
+    q = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    
+    def validate(self, data):
+        if 'min_cost' in data and 'max_cost' in data and data['min_cost'] > data['max_cost']:
+            raise serializers.ValidationError("min_cost cannot be greater than max_cost")
+        if data.get('q') and 'cursor' in data:
+            raise serializers.ValidationError("Search results are a single page; cursor cannot be combined with q")
+        return data
 
 
 class DepositSerializer(serializers.Serializer):
@@ -57,4 +166,15 @@ class DepositSerializer(serializers.Serializer):
 
 class BuySerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
-    amount = serializers.IntegerField(min_value=1)
\ No newline at end of file
+    amount = serializers.IntegerField(min_value=1)
+
+
+class BatchBuySerializer(serializers.Serializer):
+    items = BuySerializer(many=True, allow_empty=False)
+    
+    def validate_items(self, value):
+        # Merge repeated product ids so each row is locked and updated once.
+        amounts = {}
+        for item in value:
+            amounts[item['product_id']] = amounts.get(item['product_id'], 0) + item['amount']
+        return amounts
\ No newline at end of file
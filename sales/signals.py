@@ -0,0 +1,42 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.signals import post_migrate, post_save, post_delete
+from django.dispatch import receiver
+from .models import User, Product
+from .authentication import JWTAuthentication
+from .catalog import bump_catalog_version
+from .metrics import install_query_observer
+from .search import install_search_index
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_principal(sender, instance, **kwargs):
+    JWTAuthentication.invalidate_user(instance.id)
+    # Seller usernames are embedded in the catalog; buyer saves (deposits) are not.
+    if instance.role == 'seller':
+        bump_catalog_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog(sender, instance, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(connection_created)
+def observe_connection_queries(sender, connection, **kwargs):
+    # Always installed: metrics, profiling and query budget warnings all
+    # read per-request query stats through it.
+    install_query_observer(connection)
+
+
+@receiver(post_migrate)
+def restore_search_index(sender, using, **kwargs):
+    # SQLite table rebuilds in later migrations drop the search triggers.
+    if sender.label != 'sales':
+        return
+    connection = connections[using]
+    if ('sales', '0014_product_search_index') in MigrationRecorder(connection).applied_migrations():
+        install_search_index(connection)
@@ -0,0 +1,157 @@
+import random
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from . import metrics
+from .catalog import bump_catalog_version
+from .models import Product, StockShard, _supports_update_returning
+
+# Sharded stock for hot products. A product with stock_shards = N keeps its
+# stock in N StockShard rows, and a purchase decrements one shard picked at
+# random among those that can cover it. Concurrent buyers of the product
+# then rarely queue on the same row, and never on the products row.
+#
+# products.amount_available is only rewritten by rebalance_stock(), on
+# restock and whenever a purchase empties a shard. It therefore reaches 0
+# with the last unit sold, which keeps ?in_stock= (and its partial index)
+# exact. The stock reported to clients is always the sum of the shards.
+#
+# Lock order for writes touching several rows: products, then users, then
+# shards in shard order.
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def sharding_enabled():
+    return getattr(settings, 'STOCK_SHARDING', False)
+
+
+def split_stock(total, shards):
+    # Even split with the remainder on the lowest shards: 10 over 4 is [3, 3, 2, 2].
+    share, extra = divmod(total, shards)
+    return [share + (shard < extra) for shard in range(shards)]
+
+
+def stock_expression():
+    # A product's stock inside a products query. The shard sum is a
+    # correlated subquery that only runs for sharded rows.
+    shard_total = StockShard.objects.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+        total=Sum('count')
+    ).values('total')
+    return Case(
+        When(stock_shards=0, then=F('amount_available')),
+        default=Coalesce(Subquery(shard_total), 0),
+        output_field=models.IntegerField(),
+    )
+
+
+def shard_counts(product_id):
+    return dict(StockShard.objects.filter(product_id=product_id).values_list('shard', 'count'))
+
+
+def stock_totals(products):
+    # {id: stock} for Product instances; one query if any of them is sharded.
+    totals = {product.id: product.amount_available for product in products}
+    sharded = [product.id for product in products if product.stock_shards]
+    if sharded:
+        totals.update(dict.fromkeys(sharded, 0))
+        totals.update(
+            StockShard.objects.filter(product_id__in=sharded).values('product_id').annotate(
+                total=Sum('count')
+            ).values_list('product_id', 'total')
+        )
+    return totals
+
+
+def _take_from_shard(product_id, shard, amount):
+    # Guarded decrement. Returns the shard's new count, or None if it held
+    # fewer than amount units.
+    if _supports_update_returning():
+        table = connection.ops.quote_name(StockShard._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} SET count = count - %s '
+                f'WHERE product_id = %s AND shard = %s AND count >= %s RETURNING count',
+                [amount, product_id, shard, amount],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    
+    shards = StockShard.objects.filter(product_id=product_id, shard=shard)
+    if not shards.filter(count__gte=amount).update(count=F('count') - amount):
+        return None
+    return shards.values_list('count', flat=True).get()
+
+
+def take_stock(product_id, amount, counts=None):
+    # Must run inside the caller's transaction. counts: shard_counts() if the
+    # caller already has them. Returns True when a shard was emptied; the
+    # caller then rebalance_stock()s, after committing if it can.
+    while True:
+        if counts is None:
+            counts = shard_counts(product_id)
+        if sum(counts.values()) < amount:
+            raise InsufficientStock(product_id)
+        candidates = [shard for shard, count in counts.items() if count >= amount]
+        if not candidates:
+            break
+        left = _take_from_shard(product_id, random.choice(candidates), amount)
+        if left is not None:
+            return left == 0
+        # Another purchase got to that shard first: re-read and pick again.
+        counts = None
+    
+    # No single shard holds amount units: lock them all and take across shards.
+    shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('shard'))
+    remaining = amount
+    if sum(shard.count for shard in shards) < remaining:
+        raise InsufficientStock(product_id)
+    for shard in shards:
+        taken = min(shard.count, remaining)
+        shard.count -= taken
+        remaining -= taken
+    StockShard.objects.bulk_update(shards, ['count'])
+    return True
+
+
+def rebalance_stock(product_id, total=None):
+    # Spreads the product's stock evenly over its shards again, or replaces
+    # it with total (a restock), and records the total in amount_available.
+    with transaction.atomic():
+        product = Product.objects.select_for_update().filter(id=product_id).only('id', 'stock_shards').first()
+        if product is None or not product.stock_shards:
+            return
+        shards = list(StockShard.objects.select_for_update().filter(product_id=product_id).order_by('shard'))
+        if total is None:
+            total = sum(shard.count for shard in shards)
+        for shard, count in zip(shards, split_stock(total, len(shards))):
+            shard.count = count
+        StockShard.objects.bulk_update(shards, ['count'])
+        Product.objects.filter(id=product_id).update(amount_available=total, updated_at=timezone.now())
+        bump_catalog_version()
+    metrics.STOCK_REBALANCES.inc()
+
+
+def shard_stock(product_id, shards):
+    # Moves the product's stock into shards counter rows, or back into
+    # amount_available with shards=0. Returns the product's stock.
+    with transaction.atomic():
+        product = Product.objects.select_for_update().get(id=product_id)
+        existing = StockShard.objects.filter(product_id=product_id)
+        total = product.amount_available
+        if product.stock_shards:
+            total = sum(existing.select_for_update().values_list('count', flat=True))
+        existing.delete()
+        if shards:
+            StockShard.objects.bulk_create(
+                StockShard(product_id=product_id, shard=shard, count=count)
+                for shard, count in enumerate(split_stock(total, shards))
+            )
+        product.stock_shards = shards
+        product.amount_available = total
+        product.save(update_fields=['stock_shards', 'amount_available', 'updated_at'])
+    return total
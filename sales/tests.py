@@ -1,9 +1,49 @@
-from django.test import TestCase
-from django.urls import reverse
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache.backends.base import memcache_key_warnings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy
+from django.urls import resolve, reverse
+from .urls import urlpatterns
+from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import User, Product, ActiveSession
+from .models import User, Product, ActiveSession, CoinInventory, StockShard, token_digest
+from . import async_views, change as change_module
+from . import budgets, catalog, hashing, metrics, product_export, renderers, search, stock
+from .budgets import QUERY_BUDGETS, get_query_budget
+from .checks import check_authentication_backends, check_database_on_startup, check_databases
+from .middleware import QueryBudgetMiddleware
+from .profiling import PROFILE_ID_HEADER, ProfilingMiddleware
+from .hashing import HashingBusy, PasswordHashingPool
+from .management.commands.bench import Recorder, percentile
+from .change import DENOMINATIONS, TABLE_LIMIT, batch_change, current_inventory, expand_change, make_change
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .authentication import JWTAuthentication, PrincipalCache, generate_jwt_token
+from .serializers import ProductSerializer, product_rows, serialize_product_rows
+from rest_framework.renderers import JSONRenderer
+from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import ParseError
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+import csv
+import io
+import os
+import pstats
+import tempfile
+import itertools
 import json
+import random
+import threading
 
 
 class AuthenticationTests(TestCase):
@@ -83,20 +123,40 @@ class AuthenticationTests(TestCase):
     
     def test_logout_all(self):
         user = User.objects.create_user(username='buyer1', password='TestPass123!', role='buyer')
-        ActiveSession.objects.create(user=user, token='token1')
-        ActiveSession.objects.create(user=user, token='token2')
-        
         data = {'username': 'buyer1', 'password': 'TestPass123!'}
-        ActiveSession.objects.all().delete()
         login_response = self.client.post(self.login_url, data, format='json')
         token = login_response.data['token']
         
-        ActiveSession.objects.create(user=user, token='dummy_token')
-        
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
         response = self.client.post(self.logout_all_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(ActiveSession.objects.filter(user=user).count(), 0)
+        
+        self.client.credentials()
+        response = self.client.post(self.login_url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_one_session_per_user(self):
+        user = User.objects.create_user(username='buyer1', password='TestPass123!', role='buyer')
+        expires_at = timezone.now() + timedelta(days=1)
+        self.assertTrue(ActiveSession.objects.start(user, token_digest('token1'), expires_at))
+        self.assertFalse(ActiveSession.objects.start(user, token_digest('token2'), expires_at))
+        with mock.patch('sales.models._supports_update_returning', return_value=False):
+            self.assertFalse(ActiveSession.objects.start(user, token_digest('token3'), expires_at))
+        self.assertEqual(
+            list(ActiveSession.objects.filter(user=user).values_list('token_digest', flat=True)),
+            [token_digest('token1')],
+        )
+        
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ActiveSession.objects.create(user=user, token_digest=token_digest('token4'))
+    
+    def test_session_start_fallback(self):
+        user = User.objects.create_user(username='buyer1', password='TestPass123!', role='buyer')
+        expires_at = timezone.now() + timedelta(days=1)
+        with mock.patch('sales.models._supports_update_returning', return_value=False):
+            self.assertTrue(ActiveSession.objects.start(user, token_digest('token1'), expires_at))
+        self.assertIsNotNone(ActiveSession.objects.get(user=user).created_at)
 
 
 class ProductTests(TestCase):
@@ -120,7 +180,100 @@ class ProductTests(TestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
         response = self.client.get(self.products_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.json()), 1)
+    
+    def test_products_list_keyset_pages(self):
+        for i in range(5):
+            Product.objects.create(product_name=f'Item {i}', cost=50, amount_available=10, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        
+        response = self.client.get(self.products_url, {'page_size': 2})
+        self.assertEqual([p['product_name'] for p in response.json()], ['Item 0', 'Item 1'])
+        self.assertIn('rel="next"', response['Link'])
+        
+        seen = [p['product_name'] for p in response.json()]
+        while 'X-Next-Cursor' in response:
+            response = self.client.get(self.products_url, {'page_size': 2, 'cursor': response['X-Next-Cursor']})
+            seen.extend(p['product_name'] for p in response.json())
+        self.assertEqual(seen, [f'Item {i}' for i in range(5)])
+    
+    def test_products_list_filters(self):
+        other_seller = User.objects.create_user(username='seller2', password='Pass123!', role='seller')
+        Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        Product.objects.create(product_name='Water', cost=20, amount_available=0, seller=self.seller)
+        Product.objects.create(product_name='Chips', cost=75, amount_available=3, seller=other_seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        
+        def names(params):
+            return sorted(p['product_name'] for p in self.client.get(self.products_url, params).json())
+        
+        self.assertEqual(names({'seller_id': self.seller.id}), ['Coke', 'Water'])
+        self.assertEqual(names({'min_cost': 30, 'max_cost': 60}), ['Coke'])
+        self.assertEqual(names({'in_stock': 'true'}), ['Chips', 'Coke'])
+    
+    def test_products_list_invalid_cursor(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(self.products_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_products_list_not_modified(self):
+        Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        etag = self.client.get(self.products_url)['ETag']
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_products_list_snapshot_reused_until_catalog_changes(self):
+        product = Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        first = self.client.get(self.products_url)
+        
+        with self.assertNumQueries(0):
+            second = self.client.get(self.products_url)
+        self.assertEqual(second.content, first.content)
+        
+        product.amount_available = 9
+        product.save()
+        third = self.client.get(self.products_url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(third['ETag'], first['ETag'])
+        self.assertEqual(third.json()[0]['amount_available'], 9)
+    
+    def test_products_list_snapshot_ignores_unknown_parameters(self):
+        Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        first = self.client.get(self.products_url, {'q': 'Coke'})
+        
+        # Unknown parameters and equivalent spellings reuse the same snapshot.
+        with self.assertNumQueries(0):
+            for params in ({'q': 'coke', 'x': '1'}, {'q': ' COKE ', 'x': '2'}, {'q': 'Coke', 'page_size': 100}):
+                self.assertEqual(self.client.get(self.products_url, params).content, first.content)
+    
+    def test_fast_product_serialization_matches_serializer(self):
+        Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        Product.objects.create(product_name='Café ☕', cost=5, amount_available=0, seller=self.seller)
+        products = Product.objects.select_related('seller').order_by('id')
+        
+        expected = JSONRenderer().render(ProductSerializer(products, many=True).data)
+        actual = JSONRenderer().render(serialize_product_rows(product_rows(products)))
+        self.assertEqual(actual, expected)
+        
+        with timezone.override('America/New_York'):
+            expected = JSONRenderer().render(ProductSerializer(products, many=True).data)
+            actual = JSONRenderer().render(serialize_product_rows(product_rows(products)))
+        self.assertEqual(actual, expected)
+    
+    def test_get_product_detail(self):
+        product = Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(reverse('product_detail', args=[product.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, ProductSerializer(product).data)
+        
+        response = self.client.get(reverse('product_detail', args=[product.id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
     
     def test_create_product_as_seller(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.seller_token}')
@@ -229,6 +382,72 @@ class BuyerTests(TestCase):
         response = self.client.post(self.deposit_url, {'coin': 100}, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     
+    def test_deposit_is_single_conditional_update(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        # Change the balance behind the cached principal's back.
+        User.objects.filter(id=self.buyer.id).update(deposit=50)
+        
+        with self.assertNumQueries(1):
+            response = self.client.post(self.deposit_url, {'coin': 20}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['current_deposit'], 70)
+        
+        response = self.client.post(self.deposit_url, {'coin': 50}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 70)
+        self.assertEqual(self.client.get(reverse('balance')).data['deposit'], 70)
+    
+    def test_credit_deposit_without_returning_support(self):
+        with mock.patch('sales.models._supports_update_returning', return_value=False):
+            self.assertEqual(User.objects.credit_deposit(self.buyer.id, 50, limit=100), 50)
+            self.assertEqual(User.objects.credit_deposit(self.buyer.id, 50, limit=100), 100)
+            self.assertIsNone(User.objects.credit_deposit(self.buyer.id, 5, limit=100))
+    
+    def _contended_deposit(self):
+        # Another writer adds 5 cents after every unlocked read of the balance,
+        # so every compare-and-swap loses; the locked fallback runs in a savepoint.
+        baseline = len(connection.savepoint_ids)
+        
+        def contender(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if sql.startswith('SELECT "users"."deposit"') and len(connection.savepoint_ids) == baseline:
+                with connection.cursor() as cursor:
+                    cursor.execute('UPDATE users SET deposit = deposit + 5 WHERE id = %s', [self.buyer.id])
+            return result
+        
+        User.objects.filter(id=self.buyer.id).update(deposit=100)
+        return connection.execute_wrapper(contender)
+    
+    def test_reset_deposit_stops_retrying_under_contention(self):
+        with self._contended_deposit():
+            self.assertEqual(User.objects.reset_deposit(self.buyer.id, expected=0), 115)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 0)
+    
+    def test_take_deposit_stops_retrying_under_contention(self):
+        with self._contended_deposit():
+            self.assertEqual(User.objects.take_deposit(self.buyer.id, expected=0, minimum=50), 115)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 0)
+        
+        with self._contended_deposit():
+            self.assertIsNone(User.objects.take_deposit(self.buyer.id, expected=0, minimum=500))
+        self.buyer.refresh_from_db()
+        # Untouched apart from the contending writer's single top-up.
+        self.assertEqual(self.buyer.deposit, 105)
+    
+    def test_reset_uses_current_balance(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        User.objects.filter(id=self.buyer.id).update(deposit=40)
+        
+        response = self.client.post(self.reset_url)
+        self.assertEqual(response.data['previous_deposit'], 40)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 0)
+    
     def test_buy_product_success(self):
         self.buyer.deposit = 150
         self.buyer.save()
@@ -275,6 +494,61 @@ class BuyerTests(TestCase):
         self.buyer.refresh_from_db()
         self.assertEqual(self.buyer.deposit, 0)
     
+    def test_buy_batch_success(self):
+        chips = Product.objects.create(product_name='Chips', cost=45, amount_available=5, seller=self.seller)
+        self.buyer.deposit = 200
+        self.buyer.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        items = [
+            {'product_id': chips.id, 'amount': 1},
+            {'product_id': self.product.id, 'amount': 1},
+            {'product_id': self.product.id, 'amount': 1},
+        ]
+        response = self.client.post(reverse('buy_batch'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_spent'], 145)
+        self.assertEqual(response.data['change'], [50, 5])
+        self.assertEqual(
+            [(p['product_id'], p['amount_purchased']) for p in response.data['products_purchased']],
+            [(self.product.id, 2), (chips.id, 1)]
+        )
+        self.product.refresh_from_db()
+        chips.refresh_from_db()
+        self.assertEqual((self.product.amount_available, chips.amount_available), (8, 4))
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 0)
+    
+    def test_buy_batch_is_all_or_nothing(self):
+        chips = Product.objects.create(product_name='Chips', cost=45, amount_available=1, seller=self.seller)
+        self.buyer.deposit = 500
+        self.buyer.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        items = [{'product_id': self.product.id, 'amount': 1}, {'product_id': chips.id, 'amount': 2}]
+        response = self.client.post(reverse('buy_batch'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['product_ids'], [chips.id])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 10)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 500)
+    
+    def test_buy_batch_insufficient_funds(self):
+        self.buyer.deposit = 50
+        self.buyer.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.post(reverse('buy_batch'), {'items': [{'product_id': self.product.id, 'amount': 2}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('insufficient fund', response.data['error'])
+    
+    def test_buy_batch_nonexistent_product(self):
+        self.buyer.deposit = 100
+        self.buyer.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        items = [{'product_id': self.product.id, 'amount': 1}, {'product_id': 9999, 'amount': 1}]
+        response = self.client.post(reverse('buy_batch'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['product_ids'], [9999])
+    
     def test_seller_cannot_deposit(self):
         ActiveSession.objects.all().delete()
         seller_login = self.client.post(reverse('login'), {'username': 'seller1', 'password': 'Pass123!'}, format='json')
@@ -300,6 +574,44 @@ class BuyerTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
 
+@override_settings(BUY_MODE='optimistic')
+class OptimisticBuyerTests(BuyerTests):
+    def test_buy_stale_principal_deposit(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        User.objects.filter(id=self.buyer.id).update(deposit=100)
+        
+        response = self.client.post(self.buy_url, {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['change'], [50])
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 0)
+    
+    def test_buy_locks_product_before_user(self):
+        # Same lock order as the locking path, so mixed purchases cannot deadlock.
+        User.objects.filter(id=self.buyer.id).update(deposit=100)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.buy_url, {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [query['sql'].split()[1] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(updates[:2], ['"products"', '"users"'])
+    
+    def test_insufficient_funds_keeps_stock(self):
+        User.objects.filter(id=self.buyer.id).update(deposit=20)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.post(self.buy_url, {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 10)
+    
+    def test_non_negative_constraints(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(id=self.product.id).update(amount_available=-1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.filter(id=self.buyer.id).update(deposit=-5)
+
+
 class ChangeCalculationTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -343,4 +655,1437 @@ class ChangeCalculationTests(TestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
         response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['change'], [])
\ No newline at end of file
+        self.assertEqual(response.data['change'], [])
+
+class PrincipalCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        
+        ActiveSession.objects.all().delete()
+        login_response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.buyer_token = login_response.data['token']
+        JWTAuthentication.cache.clear()
+    
+    def test_repeated_requests_hit_cache(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        hits_before = JWTAuthentication.cache_stats()['hits']
+        # Only the deposit itself is read.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(JWTAuthentication.cache_stats()['hits'], hits_before + 1)
+    
+    def test_logout_invalidates_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        self.client.post(reverse('logout'))
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_force_logout_all_invalidates_cached_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        self.client.post(reverse('force_logout_all'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_user_save_refreshes_cached_principal(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        self.buyer.deposit = 75
+        self.buyer.save()
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(response.data['deposit'], 75)
+    
+    def test_balance_reads_current_deposit(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.client.get(reverse('balance'))
+        # A write that skips the signals, like a purchase on another worker.
+        User.objects.filter(id=self.buyer.id).update(deposit=40)
+        self.assertEqual(self.client.get(reverse('balance')).data['deposit'], 40)
+    
+    def test_revocations_reach_other_processes(self):
+        # Two caches sharing the Django cache stand in for two workers.
+        ours, theirs = PrincipalCache(), PrincipalCache()
+        ours.set(self.buyer_token, self.buyer)
+        theirs.invalidate_token(self.buyer_token)
+        self.assertIsNone(ours.get(self.buyer_token))
+        
+        ours.set(self.buyer_token, self.buyer)
+        self.assertEqual(ours.get(self.buyer_token).id, self.buyer.id)
+        theirs.invalidate_user(self.buyer.id)
+        self.assertIsNone(ours.get(self.buyer_token))
+    
+    def test_marker_keys_are_memcached_safe(self):
+        cache = PrincipalCache()
+        # A token whose digest contains a space byte (0x20).
+        token = next(f'token-{n}' for n in range(1000) if b' ' in token_digest(f'token-{n}'))
+        for key in cache._marker_keys(token, self.buyer.id):
+            self.assertEqual(list(memcache_key_warnings(key)), [])
+    
+    def test_revocation_while_loading_is_not_cached(self):
+        ours, theirs = PrincipalCache(), PrincipalCache()
+        revisions = ours.revisions(self.buyer_token, self.buyer.id)
+        theirs.invalidate_user(self.buyer.id)
+        ours.set(self.buyer_token, self.buyer, revisions=revisions)
+        self.assertIsNone(ours.get(self.buyer_token))
+    
+    def test_cache_is_bounded(self):
+        cache = PrincipalCache(max_size=2, ttl=60)
+        for token in ['a', 'b', 'c']:
+            cache.set(token, self.buyer)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c').id, self.buyer.id)
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+@override_settings(JWT_REFRESH_TOKENS_ENABLED=True)
+class RefreshTokenTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        
+        login_response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.access_token = login_response.data['token']
+        self.refresh_token = login_response.data['refresh_token']
+        JWTAuthentication.cache.clear()
+    
+    def test_access_token_skips_session_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        # The user and the deposit; no ActiveSession query.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_refresh_issues_new_access_token(self):
+        response = self.client.post(reverse('token_refresh'), {'refresh_token': self.refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["token"]}')
+        self.assertEqual(self.client.get(reverse('balance')).status_code, status.HTTP_200_OK)
+    
+    def test_refresh_token_cannot_authenticate(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh_token}')
+        response = self.client.get(reverse('balance'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_logout_all_revokes_access_and_refresh_tokens(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.client.get(reverse('balance'))
+        response = self.client.post(reverse('logout_all'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.session_generation, 1)
+        
+        self.assertEqual(self.client.get(reverse('balance')).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(reverse('token_refresh'), {'refresh_token': self.refresh_token}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def test_force_logout_all_revokes_access_token(self):
+        self.client.post(reverse('force_logout_all'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.assertEqual(self.client.get(reverse('balance')).status_code, status.HTTP_403_FORBIDDEN)
+
+
+class FastJSONTests(TestCase):
+    def sample_data(self):
+        return {
+            'created_at': datetime(2025, 10, 30, 10, 0, 0, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2025, 10, 30, 10, 0, 0),
+            'date': date(2025, 10, 30),
+            'price': Decimal('1.50'),
+            'name': gettext_lazy('Coke'),
+            'text': 'Café \u2028 \u2029 ☕',
+            'change': {100: 1, 5: 2},
+            'items': [1, 2.5, None, True],
+        }
+    
+    def test_renderer_matches_drf(self):
+        data = self.sample_data()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+    
+    def test_renderer_indent_falls_back(self):
+        data = self.sample_data()
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+    
+    def test_renderer_without_orjson(self):
+        data = self.sample_data()
+        with mock.patch('sales.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+    
+    def test_renderer_writes_non_finite_floats_as_null(self):
+        # Unlike DRF's strict renderer, which raises; see FastJSONRenderer.
+        data = {'values': [float('nan'), float('inf'), -float('inf'), 1.5]}
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(data)
+        if renderers.orjson is not None:
+            self.assertEqual(FastJSONRenderer().render(data), b'{"values":[null,null,null,1.5]}')
+    
+    def test_parser_round_trip(self):
+        body = '{"product_id": 1, "name": "Café ☕", "amount": [1, 2]}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+    
+    def test_parser_rejects_invalid_json(self):
+        for body in [b'{"coin": }', b'{"coin": NaN}']:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+
+class ChangeEngineTests(TestCase):
+    def test_unlimited_change_is_greedy(self):
+        self.assertEqual(make_change(95), {50: 1, 20: 2, 5: 1})
+        self.assertEqual(make_change(0), {})
+        self.assertEqual(expand_change(make_change(95)), [50, 20, 20, 5])
+    
+    def test_bounded_change_is_minimal(self):
+        inventory = {100: 0, 50: 1, 20: 3, 10: 0, 5: 0}
+        # Greedy would take the 50 and get stuck on 10.
+        self.assertEqual(make_change(60, inventory), {20: 3})
+        self.assertEqual(make_change(70, inventory), {50: 1, 20: 1})
+    
+    def test_bounded_change_matches_unlimited_when_stocked(self):
+        inventory = {coin: 1000 for coin in DENOMINATIONS}
+        for amount in range(0, 2005, 5):
+            self.assertEqual(make_change(amount, inventory), make_change(amount))
+    
+    def legacy_greedy(self, amount):
+        # The original views.calculate_change loop, kept as the oracle.
+        change = []
+        for coin in [100, 50, 20, 10, 5]:
+            while amount >= coin:
+                change.append(coin)
+                amount -= coin
+        return change
+    
+    def test_precomputed_table_matches_legacy_greedy(self):
+        for amount in range(0, TABLE_LIMIT + 1, 5):
+            self.assertEqual(expand_change(make_change(amount)), self.legacy_greedy(amount))
+        
+        rng = random.Random(12)
+        for amount in rng.sample(range(TABLE_LIMIT, 10 ** 6, 5), 200):
+            self.assertEqual(expand_change(make_change(amount)), self.legacy_greedy(amount))
+    
+    def test_batch_change_matches_single_amounts(self):
+        rng = random.Random(7)
+        amounts = [5 * rng.randrange(0, 2 * TABLE_LIMIT // 5) for _ in range(3000)]
+        expected = [tuple(self.legacy_greedy(a).count(coin) for coin in DENOMINATIONS) for a in amounts]
+        
+        with mock.patch('sales.change.numpy', None):
+            self.assertEqual(batch_change(amounts), expected)
+        if change_module.numpy is not None:
+            self.assertEqual([tuple(row) for row in batch_change(amounts).tolist()], expected)
+            small = [a for a in amounts if a <= TABLE_LIMIT]
+            self.assertEqual([tuple(row) for row in batch_change(small).tolist()], [expected[i] for i, a in enumerate(amounts) if a <= TABLE_LIMIT])
+    
+    def test_batch_change_rejects_invalid_amounts(self):
+        for amounts in [[5, 7], [-5]]:
+            with self.assertRaises(ValueError):
+                batch_change(amounts)
+            with mock.patch('sales.change.numpy', None), self.assertRaises(ValueError):
+                batch_change(amounts)
+    
+    def test_bounded_change_properties(self):
+        rng = random.Random(3)
+        for _ in range(300):
+            inventory = {coin: rng.randrange(0, 4) for coin in DENOMINATIONS}
+            amount = 5 * rng.randrange(0, 41)
+            breakdown = make_change(amount, inventory)
+            
+            # Brute force over every combination the inventory allows.
+            best = None
+            for combo in itertools.product(*(range(inventory[coin] + 1) for coin in DENOMINATIONS)):
+                if sum(c * coin for c, coin in zip(combo, DENOMINATIONS)) == amount:
+                    best = sum(combo) if best is None else min(best, sum(combo))
+            
+            if best is None:
+                self.assertIsNone(breakdown)
+                continue
+            self.assertEqual(sum(coin * count for coin, count in breakdown.items()), amount)
+            self.assertTrue(all(count <= inventory[coin] for coin, count in breakdown.items()))
+            self.assertEqual(sum(breakdown.values()), best)
+    
+    def test_infeasible_change(self):
+        self.assertIsNone(make_change(15, {100: 5, 50: 5, 20: 5, 10: 1, 5: 0}))
+        self.assertIsNone(make_change(7, {5: 10}))
+
+
+@override_settings(TRACK_COIN_INVENTORY=True)
+class CoinInventoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        
+        login_response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {login_response.data["token"]}')
+        
+        self.product = Product.objects.create(product_name='Coke', cost=65, amount_available=10, seller=self.seller)
+    
+    def set_inventory(self, **counts):
+        for coin in DENOMINATIONS:
+            CoinInventory.objects.filter(denomination=coin).update(count=counts.get(f'c{coin}', 0))
+    
+    def test_deposit_fills_inventory(self):
+        self.set_inventory()
+        self.client.post(reverse('deposit'), {'coin': 50}, format='json')
+        self.client.post(reverse('deposit'), {'coin': 50}, format='json')
+        self.assertEqual(current_inventory()[50], 2)
+    
+    def test_buy_drains_inventory(self):
+        self.set_inventory(c20=1, c10=3, c5=1)
+        self.client.post(reverse('deposit'), {'coin': 100}, format='json')
+        response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['change'], [20, 10, 5])
+        self.assertEqual(current_inventory(), {100: 1, 50: 0, 20: 0, 10: 2, 5: 0})
+    
+    def test_buy_refused_without_change(self):
+        self.set_inventory(c20=1)
+        self.client.post(reverse('deposit'), {'coin': 100}, format='json')
+        response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cannot return change', response.data['error'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 10)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 100)
+        self.assertEqual(current_inventory()[20], 1)
+    
+    @override_settings(BUY_MODE='optimistic')
+    def test_optimistic_buy_refused_without_change(self):
+        self.set_inventory()
+        self.client.post(reverse('deposit'), {'coin': 100}, format='json')
+        response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 10)
+    
+    def test_reset_refunds_from_inventory(self):
+        self.set_inventory()
+        self.client.post(reverse('deposit'), {'coin': 20}, format='json')
+        response = self.client.post(reverse('reset'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(current_inventory()[20], 0)
+
+
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        JWTAuthentication.cache.clear()
+        self.factory = AsyncRequestFactory()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer', deposit=35)
+        self.seller_token = self._issue_token(self.seller)
+        self.buyer_token = self._issue_token(self.buyer)
+        self.product = Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+    
+    def _issue_token(self, user):
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        return token
+    
+    def _auth(self, token):
+        return {'Authorization': f'Bearer {token}'}
+    
+    async def test_product_list_matches_sync_view(self):
+        request = self.factory.get('/api/products/', {'page_size': 1}, headers=self._auth(self.buyer_token))
+        response = await async_views.product_list(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)[0]['product_name'], 'Coke')
+        self.assertIn('ETag', response)
+        
+        request = self.factory.get('/api/products/', headers={**self._auth(self.buyer_token), 'If-None-Match': response['ETag']})
+        response = await async_views.product_list(request)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    async def test_product_list_shares_catalog_cache_with_sync_helpers(self):
+        request = self.factory.get('/api/products/', headers=self._auth(self.buyer_token))
+        response = await async_views.product_list(request)
+        self.assertEqual(response['ETag'], catalog.catalog_etag(catalog.get_catalog_version()))
+        self.assertEqual(await catalog.aget_catalog_version(), catalog.get_catalog_version())
+        content, _ = catalog.get_snapshot(catalog.get_catalog_version(), {'in_stock': False})
+        self.assertEqual(content, response.content)
+    
+    def test_product_list_body_identical_to_wsgi_path(self):
+        for i in range(3):
+            Product.objects.create(product_name=f'Item {i}', cost=5, amount_available=0, seller=self.seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        expected = self.client.get(reverse('product_list'), {'page_size': 2, 'in_stock': 'false'})
+        
+        # Drop the snapshot so the async view renders from the database itself.
+        with override_settings(CATALOG_SNAPSHOT_TTL=0):
+            request = self.factory.get('/api/products/', {'page_size': 2, 'in_stock': 'false'}, headers=self._auth(self.buyer_token))
+            response = async_to_sync(async_views.product_list)(request)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['X-Next-Cursor'], expected['X-Next-Cursor'])
+    
+    async def test_product_list_rejects_invalid_cursor(self):
+        request = self.factory.get('/api/products/', {'cursor': 'bogus'}, headers=self._auth(self.buyer_token))
+        response = await async_views.product_list(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    async def test_product_detail(self):
+        request = self.factory.get(f'/api/products/{self.product.id}/', headers=self._auth(self.buyer_token))
+        response = await async_views.product_detail(request, pk=self.product.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['seller_username'], 'seller1')
+        
+        request = self.factory.get('/api/products/0/', headers=self._auth(self.buyer_token))
+        response = await async_views.product_detail(request, pk=0)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    async def test_balance(self):
+        request = self.factory.get('/api/balance/', headers=self._auth(self.buyer_token))
+        response = await async_views.balance(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), {'username': 'buyer1', 'deposit': 35})
+    
+    async def test_balance_permissions_match_drf(self):
+        request = self.factory.get('/api/balance/', headers=self._auth(self.seller_token))
+        response = await async_views.balance(request)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        response = await async_views.balance(self.factory.get('/api/balance/'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(json.loads(response.content)['detail'], 'Authentication credentials were not provided.')
+        
+        await ActiveSession.objects.filter(user=self.buyer).adelete()
+        JWTAuthentication.invalidate_user(self.buyer.id)
+        request = self.factory.get('/api/balance/', headers=self._auth(self.buyer_token))
+        response = await async_views.balance(request)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(json.loads(response.content)['detail'], 'Session is no longer active')
+    
+    async def test_async_auth_populates_principal_cache(self):
+        request = self.factory.get('/api/balance/', headers=self._auth(self.buyer_token))
+        await async_views.balance(request)
+        hits = JWTAuthentication.cache_stats()['hits']
+        await async_views.balance(self.factory.get('/api/balance/', headers=self._auth(self.buyer_token)))
+        self.assertEqual(JWTAuthentication.cache_stats()['hits'], hits + 1)
+    
+    async def test_writes_are_delegated_to_drf_view(self):
+        request = self.factory.post(
+            '/api/products/', {'product_name': 'Pepsi', 'cost': 45, 'amount_available': 3},
+            content_type='application/json', headers=self._auth(self.seller_token)
+        )
+        response = await async_views.product_list(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await Product.objects.filter(product_name='Pepsi').aexists())
+
+
+class DatabaseCheckTests(TestCase):
+    def test_database_check_passes(self):
+        self.assertEqual(check_databases(None, databases=['default']), [])
+    
+    def test_database_check_reports_unreachable_database(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('connection refused')):
+            errors = check_databases(None, databases=['default'])
+        self.assertEqual([error.id for error in errors], ['sales.E001'])
+        self.assertIn('connection refused', errors[0].msg)
+    
+    @override_settings(DB_STARTUP_CHECK=True)
+    def test_startup_check_fails_fast(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('connection refused')):
+            with self.assertRaises(ImproperlyConfigured):
+                check_database_on_startup()
+    
+    @override_settings(DB_STARTUP_CHECK=True)
+    def test_startup_check_releases_its_connection(self):
+        with mock.patch.object(connection, 'close') as close:
+            check_database_on_startup()
+        close.assert_called_once_with()
+        
+        with mock.patch.object(connection, 'close') as close:
+            with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('connection refused')):
+                with self.assertRaises(ImproperlyConfigured):
+                    check_database_on_startup()
+        close.assert_called_once_with()
+    
+    @override_settings(DB_STARTUP_CHECK=False)
+    def test_startup_check_can_be_disabled(self):
+        with mock.patch.object(connection, 'ensure_connection', side_effect=OperationalError('connection refused')):
+            check_database_on_startup()
+
+
+class BenchReportTests(TestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertIsNone(percentile([], 50))
+    
+    def test_report_groups_samples_by_endpoint(self):
+        recorder = Recorder()
+        recorder.record('buy', 0.010, 5, 200)
+        recorder.record('buy', 0.030, 7, 400)
+        recorder.record('login', 0.100, 3, 200)
+        
+        report = recorder.report(elapsed=2.0)
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(report['throughput_rps'], 1.5)
+        self.assertEqual(list(report['endpoints']), ['login', 'buy'])
+        buy = report['endpoints']['buy']
+        self.assertEqual(buy['errors'], 1)
+        self.assertEqual(buy['statuses'], {'200': 1, '400': 1})
+        self.assertEqual(buy['queries_per_request'], 6)
+        self.assertAlmostEqual(buy['p99_ms'], 30.0)
+        json.dumps(report)
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        JWTAuthentication.cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer', deposit=100)
+        self.seller_token = self._issue_token(self.seller)
+        self.buyer_token = self._issue_token(self.buyer)
+        self.product = Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=self.seller)
+        self.other_product = Product.objects.create(product_name='Pepsi', cost=20, amount_available=10, seller=self.seller)
+    
+    def _issue_token(self, user):
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        return token
+    
+    def assertQueryBudget(self, url_name, method, token=None, data=None, exact=True, content_type=None, **kwargs):
+        budget = get_query_budget(url_name, method)
+        self.assertIsNotNone(budget, f'No query budget for {method} {url_name}')
+        if token:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        # Measure the cold path: no cached principal to skip the auth queries.
+        JWTAuthentication.cache.clear()
+        request = getattr(self.client, method.lower())
+        body = {'content_type': content_type} if content_type else {'format': 'json'}
+        if exact:
+            with self.assertNumQueries(budget):
+                response = request(reverse(url_name, kwargs=kwargs), data, **body)
+        else:
+            with CaptureQueriesContext(connection) as queries:
+                response = request(reverse(url_name, kwargs=kwargs), data, **body)
+            self.assertLessEqual(len(queries), budget, '\n'.join(query['sql'] for query in queries))
+        self.assertLess(response.status_code, 400, None if response.streaming else response.content)
+        return response
+    
+    def test_every_route_has_a_budget(self):
+        self.assertEqual({pattern.name for pattern in urlpatterns}, set(QUERY_BUDGETS))
+    
+    def test_register(self):
+        self.assertQueryBudget('register', 'POST', data={'username': 'buyer2', 'password': 'TestPass123!', 'role': 'buyer'})
+    
+    def test_login(self):
+        User.objects.create_user(username='buyer2', password='Pass123!', role='buyer')
+        self.assertQueryBudget('login', 'POST', data={'username': 'buyer2', 'password': 'Pass123!'})
+    
+    @override_settings(JWT_REFRESH_TOKENS_ENABLED=True)
+    def test_token_refresh(self):
+        ActiveSession.objects.filter(user=self.buyer).delete()
+        response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.assertQueryBudget('token_refresh', 'POST', data={'refresh_token': response.data['refresh_token']})
+    
+    def test_logout(self):
+        self.assertQueryBudget('logout', 'POST', token=self.buyer_token)
+    
+    def test_logout_all(self):
+        self.assertQueryBudget('logout_all', 'POST', token=self.buyer_token)
+    
+    def test_force_logout_all(self):
+        self.assertQueryBudget('force_logout_all', 'POST', data={'username': 'buyer1', 'password': 'Pass123!'})
+    
+    def test_product_list(self):
+        for i in range(20):
+            Product.objects.create(product_name=f'Item {i}', cost=5, amount_available=1, seller=self.seller)
+        self.assertQueryBudget('product_list', 'GET', token=self.buyer_token)
+    
+    def test_product_create(self):
+        self.assertQueryBudget(
+            'product_list', 'POST', token=self.seller_token,
+            data={'product_name': 'Fanta', 'cost': 45, 'amount_available': 3}
+        )
+    
+    def test_product_import(self):
+        # One chunk that both updates and creates.
+        self.assertQueryBudget(
+            'product_import', 'POST', token=self.seller_token,
+            data='product_name,amount_available,cost\nCoke,5,55\nFanta,3,45\n', content_type='text/csv'
+        )
+    
+    def test_product_search(self):
+        self.assertQueryBudget('product_list', 'GET', token=self.buyer_token, data={'q': 'co'})
+    
+    def test_product_export(self):
+        self.assertQueryBudget('product_export', 'GET', token=self.buyer_token)
+    
+    def test_product_detail(self):
+        self.assertQueryBudget('product_detail', 'GET', token=self.buyer_token, pk=self.product.id)
+    
+    def test_product_update(self):
+        self.assertQueryBudget('product_detail', 'PUT', token=self.seller_token, data={'cost': 55}, pk=self.product.id)
+    
+    def test_product_delete(self):
+        self.assertQueryBudget('product_detail', 'DELETE', token=self.seller_token, pk=self.product.id)
+    
+    def test_deposit(self):
+        User.objects.filter(id=self.buyer.id).update(deposit=0)
+        self.assertQueryBudget('deposit', 'POST', token=self.buyer_token, data={'coin': 50})
+    
+    def test_buy(self):
+        self.assertQueryBudget('buy', 'POST', token=self.buyer_token, data={'product_id': self.product.id, 'amount': 1})
+    
+    @override_settings(BUY_MODE='optimistic')
+    def test_buy_optimistic(self):
+        self.assertQueryBudget(
+            'buy', 'POST', token=self.buyer_token, data={'product_id': self.product.id, 'amount': 1}, exact=False
+        )
+    
+    @override_settings(STOCK_SHARDING=True)
+    def test_buy_sharded(self):
+        call_command('shard_stock', self.product.id, 4, stdout=io.StringIO())
+        self.assertQueryBudget(
+            'buy', 'POST', token=self.buyer_token, data={'product_id': self.product.id, 'amount': 1}, exact=False
+        )
+    
+    def test_buy_batch(self):
+        items = [{'product_id': self.product.id, 'amount': 1}, {'product_id': self.other_product.id, 'amount': 2}]
+        self.assertQueryBudget('buy_batch', 'POST', token=self.buyer_token, data={'items': items})
+    
+    def test_reset(self):
+        self.assertQueryBudget('reset', 'POST', token=self.buyer_token)
+    
+    def test_balance(self):
+        self.assertQueryBudget('balance', 'GET', token=self.buyer_token)
+    
+    def test_budget_middleware_logs_overruns_with_duplicate_sql(self):
+        middleware = settings.MIDDLEWARE + ['sales.middleware.QueryBudgetMiddleware']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        with override_settings(MIDDLEWARE=middleware):
+            with self.assertNoLogs('sales.query_budget'):
+                self.client.get(reverse('balance'))
+            
+            JWTAuthentication.cache.clear()
+            with mock.patch.dict(budgets.QUERY_BUDGETS, {'balance': {'GET': 1}}):
+                with self.assertLogs('sales.query_budget', level='WARNING') as logs:
+                    self.client.get(reverse('balance'))
+        self.assertIn('GET balance ran 3 queries (budget 1)', logs.output[0])
+    
+    def test_budget_middleware_reports_repeated_statements(self):
+        def n_plus_one(request):
+            for user_id in (self.buyer.id, self.seller.id, self.buyer.id, self.seller.id):
+                User.objects.filter(id=user_id).exists()
+            return HttpResponse()
+        
+        request = RequestFactory().get(reverse('balance'))
+        request.resolver_match = resolve(reverse('balance'))
+        with self.assertLogs('sales.query_budget', level='WARNING') as logs:
+            QueryBudgetMiddleware(n_plus_one)(request)
+        self.assertIn('ran 4 queries (budget 3)', logs.output[0])
+        self.assertIn('4x SELECT', logs.output[0])
+        self.assertIn('FROM "users" WHERE "users"."id" = %s', logs.output[0])
+    
+    def test_budget_middleware_sees_async_view_queries(self):
+        async def n_plus_one(request):
+            for user_id in (self.buyer.id, self.seller.id, self.buyer.id, self.seller.id):
+                await sync_to_async(User.objects.filter(id=user_id).exists)()
+            return HttpResponse()
+        
+        middleware = QueryBudgetMiddleware(n_plus_one)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get(reverse('balance'))
+        request.resolver_match = resolve(reverse('balance'))
+        with self.assertLogs('sales.query_budget', level='WARNING') as logs:
+            async_to_sync(middleware)(request)
+        self.assertIn('ran 4 queries (budget 3)', logs.output[0])
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset_metrics()
+        JWTAuthentication.cache.clear()
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        token = generate_jwt_token(self.buyer)
+        ActiveSession.objects.create(user=self.buyer, token_digest=token_digest(token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.product = Product.objects.create(product_name='Coke', cost=35, amount_available=1, seller=self.seller)
+    
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def scrape(self):
+        response = APIClient().get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+    
+    def test_purchase_and_change_counters(self):
+        self.client.post(reverse('deposit'), {'coin': 100}, format='json')
+        self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
+        
+        lines = self.scrape()
+        self.assertIn('vending_purchases_total 1', lines)
+        self.assertIn('vending_items_sold_total 1', lines)
+        self.assertIn('vending_change_coins_total{coin="50"} 1', lines)
+        self.assertIn('vending_change_coins_total{coin="10"} 1', lines)
+        self.assertIn('vending_change_coins_total{coin="5"} 1', lines)
+        self.assertIn('vending_change_coins_total{coin="100"} 0', lines)
+    
+    def test_refusal_counters(self):
+        response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 1}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': 2}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        lines = self.scrape()
+        self.assertIn('vending_insufficient_funds_total 1', lines)
+        self.assertIn('vending_insufficient_stock_total 1', lines)
+        self.assertIn('vending_purchases_total 0', lines)
+        self.assertIn('vending_http_responses_total{route="buy",status="4xx"} 2', lines)
+    
+    def test_auth_failures_counted(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.client.get(reverse('balance'))
+        self.client.credentials()
+        self.assertIn('vending_auth_failures_total 1', self.scrape())
+    
+    def test_route_histograms_record_latency_and_queries(self):
+        self.client.get(reverse('balance'))
+        lines = self.scrape()
+        self.assertIn('vending_http_request_duration_seconds_count{route="balance"} 1', lines)
+        self.assertIn('vending_http_request_duration_seconds_bucket{route="balance",le="+Inf"} 1', lines)
+        # Cold principal cache: user lookup, session check and the deposit.
+        self.assertIn('vending_http_db_queries_sum{route="balance"} 3', lines)
+        self.assertIn('vending_http_db_queries_bucket{route="balance",le="2"} 0', lines)
+        self.assertIn('vending_http_db_queries_bucket{route="balance",le="3"} 1', lines)
+        self.assertIn('vending_http_responses_total{route="balance",status="2xx"} 1', lines)
+    
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram((1, 5, 10))
+        for value in (0, 1, 3, 7, 50):
+            histogram.observe(value)
+        self.assertEqual(histogram.render('h', 'r'), [
+            'h_bucket{route="r",le="1"} 2',
+            'h_bucket{route="r",le="5"} 3',
+            'h_bucket{route="r",le="10"} 4',
+            'h_bucket{route="r",le="+Inf"} 5',
+            'h_sum{route="r"} 61',
+            'h_count{route="r"} 5',
+        ])
+    
+    def test_async_middleware_counts_queries_on_worker_threads(self):
+        async def view(request):
+            await sync_to_async(User.objects.count)()
+            await sync_to_async(Product.objects.count)()
+            return HttpResponse()
+        
+        middleware = metrics.MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = AsyncRequestFactory().get(reverse('balance'))
+        request.resolver_match = resolve(reverse('balance'))
+        async_to_sync(middleware)(request)
+        self.assertIn('vending_http_db_queries_sum{route="balance"} 2', self.scrape())
+    
+    def test_unauthenticated_scrape_refused(self):
+        anonymous = APIClient()
+        # No token configured: nobody may scrape.
+        self.assertEqual(anonymous.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(anonymous.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+            response = anonymous.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+            # A user's JWT is not a scrape token either.
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+    
+    @override_settings(METRICS_ENABLED=False)
+    def test_endpoint_disabled(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        JWTAuthentication.cache.clear()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        middleware = settings.MIDDLEWARE + ['sales.profiling.ProfilingMiddleware']
+        self.settings_override = override_settings(MIDDLEWARE=middleware, PROFILING_DIR=self.profile_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        
+        self.client = APIClient()
+        self.staff = User.objects.create_user(username='staff1', password='Pass123!', role='buyer', is_staff=True)
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        self.staff_token = self._issue_token(self.staff)
+        self.buyer_token = self._issue_token(self.buyer)
+    
+    def _issue_token(self, user):
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        return token
+    
+    def test_staff_request_is_profiled(self):
+        seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        product = Product.objects.create(product_name='Coke', cost=50, amount_available=10, seller=seller)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
+        response = self.client.get(reverse('product_detail', args=[product.id]), headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_id = response[PROFILE_ID_HEADER]
+        
+        stats = pstats.Stats(os.path.join(self.profile_dir.name, f'{profile_id}.prof'))
+        self.assertTrue(stats.total_calls)
+        with open(os.path.join(self.profile_dir.name, f'{profile_id}.json')) as artifact:
+            report = json.load(artifact)
+        self.assertEqual(report['route'], 'product_detail')
+        self.assertEqual(report['reason'], 'requested')
+        self.assertEqual(report['status'], 200)
+        # The staff check already cached the principal, so only the row fetch remains.
+        self.assertEqual(len(report['queries']), 1)
+        self.assertIn('FROM "products"', report['queries'][0]['sql'])
+    
+    def test_async_request_is_profiled(self):
+        async def view(request):
+            await sync_to_async(User.objects.count)()
+            return HttpResponse()
+        
+        request = AsyncRequestFactory().get(
+            reverse('balance'), headers={'X-Profile': '1', 'Authorization': f'Bearer {self.staff_token}'}
+        )
+        request.resolver_match = resolve(reverse('balance'))
+        response = async_to_sync(ProfilingMiddleware(view))(request)
+        with open(os.path.join(self.profile_dir.name, f'{response[PROFILE_ID_HEADER]}.json')) as artifact:
+            report = json.load(artifact)
+        self.assertEqual(report['route'], 'balance')
+        self.assertEqual([query['sql'].split(' FROM ')[1][:7] for query in report['queries']], ['"users"'])
+    
+    def test_query_flag(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.staff_token}')
+        response = self.client.get(reverse('balance'), {'profile': '1'})
+        self.assertIn(PROFILE_ID_HEADER, response)
+    
+    def test_flag_ignored_for_non_staff(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(reverse('balance'), headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+        
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        response = self.client.get(reverse('balance'), headers={'X-Profile': '1'})
+        self.assertNotIn(PROFILE_ID_HEADER, response)
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+    
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_PROFILES=2)
+    def test_only_newest_profiles_are_kept(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        profile_ids = [self.client.get(reverse('balance'))[PROFILE_ID_HEADER] for _ in range(4)]
+        kept = sorted(os.listdir(self.profile_dir.name))
+        self.assertEqual(kept, sorted(f'{profile_id}.{extension}' for profile_id in profile_ids[2:] for extension in ('json', 'prof')))
+    
+    @override_settings(PROFILING_SAMPLE_RATE=3)
+    def test_sampling_profiles_one_in_n(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        profiled = [PROFILE_ID_HEADER in self.client.get(reverse('balance')) for _ in range(6)]
+        self.assertEqual(profiled.count(True), 2)
+        self.assertEqual(len(os.listdir(self.profile_dir.name)), 4)
+
+
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        metrics.reset_metrics()
+        self.client = APIClient()
+        self.factory = AsyncRequestFactory()
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+    
+    def _blocked_pool(self):
+        # One worker, no queue, held busy until the returned event is set.
+        pool = PasswordHashingPool(workers=1, queue_size=0)
+        release = threading.Event()
+        future = pool.submit(release.wait)
+        self.addCleanup(future.result)
+        self.addCleanup(release.set)
+        return pool, release, future
+    
+    def test_pool_rejects_when_full(self):
+        pool, release, blocker = self._blocked_pool()
+        with self.assertRaises(HashingBusy):
+            pool.submit(make_password, 'Pass123!')
+        self.assertEqual(metrics.PASSWORD_HASHES_REJECTED.values[None], 1)
+        self.assertEqual(metrics.PASSWORD_HASHES_IN_FLIGHT.values[None], 1)
+        
+        release.set()
+        blocker.result()
+        self.assertTrue(pool.run(make_password, 'Pass123!').startswith('pbkdf2_sha256$'))
+        self.assertEqual(metrics.PASSWORD_HASHES_IN_FLIGHT.values[None], 0)
+    
+    def test_login_returns_503_when_pool_busy(self):
+        pool, _, _ = self._blocked_pool()
+        with mock.patch.object(hashing, '_pool', pool):
+            response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(ActiveSession.objects.exists())
+    
+    def test_register_hashes_on_pool(self):
+        response = self.client.post(reverse('register'), {'username': 'new', 'password': 'Pass123!', 'role': 'buyer'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='new').check_password('Pass123!'))
+        self.assertIn('vending_password_hash_duration_seconds_count 1', metrics.render_metrics())
+    
+    def test_invalid_credentials(self):
+        for username, password in (('buyer1', 'wrong'), ('nobody', 'Pass123!')):
+            response = self.client.post(reverse('login'), {'username': username, 'password': password}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        self.buyer.is_active = False
+        self.buyer.save()
+        response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+    
+    def _failed_logins(self):
+        failed = []
+        
+        def receiver(sender, credentials, request=None, **kwargs):
+            failed.append((credentials, request is not None))
+        
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        return failed
+    
+    def test_failed_login_sends_user_login_failed(self):
+        failed = self._failed_logins()
+        self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.assertEqual(failed, [])
+        for username, password in (('buyer1', 'wrong'), ('nobody', 'Pass123!')):
+            self.client.post(reverse('force_logout_all'), {'username': username, 'password': password}, format='json')
+        self.assertEqual(failed, [
+            ({'username': 'buyer1', 'password': '********************'}, True),
+            ({'username': 'nobody', 'password': '********************'}, True),
+        ])
+    
+    def test_async_failed_login_sends_user_login_failed(self):
+        failed = self._failed_logins()
+        self._post(async_views.login, '/api/login/', {'username': 'buyer1', 'password': 'wrong'})
+        self.assertEqual(failed, [({'username': 'buyer1', 'password': '********************'}, True)])
+    
+    def test_only_model_backend_is_supported(self):
+        self.assertEqual(check_authentication_backends(None), [])
+        backends = ['django.contrib.auth.backends.ModelBackend', 'django.contrib.auth.backends.RemoteUserBackend']
+        with override_settings(AUTHENTICATION_BACKENDS=backends):
+            self.assertEqual([error.id for error in check_authentication_backends(None)], ['sales.E002'])
+    
+    def test_outdated_hash_upgraded_on_login(self):
+        self.buyer.password = make_password('Pass123!', hasher='pbkdf2_sha1')
+        self.buyer.save()
+        response = self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.buyer.refresh_from_db()
+        self.assertTrue(self.buyer.password.startswith('pbkdf2_sha256$'))
+    
+    def _post(self, view, path, data):
+        request = self.factory.post(path, data, content_type='application/json')
+        return async_to_sync(view)(request)
+    
+    def test_async_register_login_and_force_logout(self):
+        response = self._post(async_views.register, '/api/register/', {'username': 'new', 'password': 'Pass123!', 'role': 'buyer'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content)['user']['username'], 'new')
+        
+        response = self._post(async_views.login, '/api/login/', {'username': 'new', 'password': 'Pass123!'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('token', json.loads(response.content))
+        
+        response = self._post(async_views.login, '/api/login/', {'username': 'new', 'password': 'Pass123!'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        
+        response = self._post(async_views.force_logout_all, '/api/logout/force/', {'username': 'new', 'password': 'Pass123!'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(ActiveSession.objects.filter(user__username='new').exists())
+    
+    def test_async_errors_match_sync_views(self):
+        response = self._post(async_views.login, '/api/login/', {'username': 'buyer1', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(json.loads(response.content), {'error': 'Invalid credentials'})
+        
+        response = self._post(async_views.register, '/api/register/', {'username': 'buyer1', 'password': 'Pass123!', 'role': 'buyer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('username', json.loads(response.content))
+        
+        request = self.factory.post('/api/login/', '{not json', content_type='application/json')
+        response = async_to_sync(async_views.login)(request)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        pool, _, _ = self._blocked_pool()
+        with mock.patch.object(hashing, '_pool', pool):
+            response = self._post(async_views.login, '/api/login/', {'username': 'buyer1', 'password': 'Pass123!'})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class SessionExpiryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+    
+    def _login(self):
+        return self.client.post(reverse('login'), {'username': 'buyer1', 'password': 'Pass123!'}, format='json')
+    
+    def test_login_sets_expires_at(self):
+        self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+        remaining = ActiveSession.objects.get(user=self.buyer).expires_at - timezone.now()
+        self.assertAlmostEqual(remaining.total_seconds(), timedelta(days=1).total_seconds(), delta=60)
+    
+    @override_settings(JWT_REFRESH_TOKENS_ENABLED=True, JWT_REFRESH_TOKEN_LIFETIME=3600)
+    def test_refresh_session_expires_with_refresh_token(self):
+        self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+        remaining = ActiveSession.objects.get(user=self.buyer).expires_at - timezone.now()
+        self.assertAlmostEqual(remaining.total_seconds(), 3600, delta=60)
+    
+    def test_login_replaces_expired_session(self):
+        ActiveSession.objects.create(
+            user=self.buyer, token_digest=token_digest('stale'), expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        response = self._login()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        session = ActiveSession.objects.get(user=self.buyer)
+        self.assertEqual(bytes(session.token_digest), token_digest(response.data['token']))
+        self.assertGreater(session.expires_at, timezone.now())
+        
+        self.assertEqual(self._login().status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_login_replaces_expired_session_fallback(self):
+        ActiveSession.objects.create(
+            user=self.buyer, token_digest=token_digest('stale'), expires_at=timezone.now() - timedelta(seconds=1)
+        )
+        with mock.patch('sales.models._supports_update_returning', return_value=False):
+            self.assertEqual(self._login().status_code, status.HTTP_200_OK)
+            self.assertEqual(self._login().status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_reap_sessions_deletes_expired_in_batches(self):
+        past = timezone.now() - timedelta(minutes=1)
+        for i in range(5):
+            user = User.objects.create(username=f'expired{i}', role='buyer')
+            ActiveSession.objects.create(user=user, token_digest=token_digest(f'expired{i}'), expires_at=past)
+        live = ActiveSession.objects.create(user=self.buyer, token_digest=token_digest('live'))
+        
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('reap_sessions', batch_size=2, stdout=out)
+        self.assertIn('Deleted 5 expired session(s)', out.getvalue())
+        self.assertEqual(list(ActiveSession.objects.values_list('id', flat=True)), [live.id])
+        # Three batches (2 + 2 + 1), each one id lookup and one delete.
+        self.assertEqual(len(queries), 6)
+    
+    def test_reap_sessions_rejects_bad_batch_size(self):
+        with self.assertRaises(CommandError):
+            call_command('reap_sessions', batch_size=0, stdout=io.StringIO())
+
+
+class ProductImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.other_seller = User.objects.create_user(username='seller2', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        self.seller_token = self._issue_token(self.seller)
+        self.buyer_token = self._issue_token(self.buyer)
+        self.url = reverse('product_import')
+    
+    def _issue_token(self, user):
+        token = generate_jwt_token(user)
+        ActiveSession.objects.create(user=user, token_digest=token_digest(token))
+        return token
+    
+    def _import(self, body, content_type, token=None):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token or self.seller_token}')
+        return self.client.generic('POST', self.url, body, content_type=content_type)
+    
+    def test_csv_upsert_by_seller_and_name(self):
+        Product.objects.create(product_name='Coke', cost=50, amount_available=1, seller=self.seller)
+        Product.objects.create(product_name='Fanta', cost=30, amount_available=2, seller=self.seller)
+        theirs = Product.objects.create(product_name='Pepsi', cost=40, amount_available=3, seller=self.other_seller)
+        body = 'product_name,amount_available,cost\nCoke,10,55\nFanta,2,30\nPepsi,5,45\n"Water, still",7,20\n'
+        
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'created': 2, 'updated': 1, 'unchanged': 1, 'errors': []})
+        
+        mine = dict(Product.objects.filter(seller=self.seller).values_list('product_name', 'cost'))
+        self.assertEqual(mine, {'Coke': 55, 'Fanta': 30, 'Pepsi': 45, 'Water, still': 20})
+        theirs.refresh_from_db()
+        self.assertEqual((theirs.cost, theirs.amount_available), (40, 3))
+    
+    def test_ndjson_reports_row_errors_and_keeps_good_rows(self):
+        body = '\n'.join([
+            '{"product_name": "Coke", "amount_available": 10, "cost": 50}',
+            '{"product_name": "Bad cost", "amount_available": 1, "cost": 52}',
+            '{"product_name": "Negative", "amount_available": -1, "cost": 50}',
+            'not json',
+            '[1, 2]',
+            '',
+            '{"product_name": "Water", "amount_available": 3, "cost": 20}',
+        ])
+        response = self._import(body, 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [2, 3, 4, 5])
+        self.assertEqual(data['errors'][0]['errors'], {'cost': ['Cost must be in multiples of 5']})
+        self.assertIn('amount_available', data['errors'][1]['errors'])
+        self.assertEqual(data['errors'][2]['errors'], {'non_field_errors': ['Invalid JSON']})
+        self.assertEqual(set(Product.objects.values_list('product_name', flat=True)), {'Coke', 'Water'})
+    
+    def test_chunks_commit_independently(self):
+        rows = ''.join(f'Item {i},1,5\n' for i in range(5))
+        body = 'product_name,amount_available,cost\n' + rows
+        original = Product.objects.bulk_create
+        calls = []
+        
+        def failing_second_chunk(objs, *args, **kwargs):
+            calls.append(len(objs))
+            if len(calls) == 2:
+                raise IntegrityError('boom')
+            return original(objs, *args, **kwargs)
+        
+        with override_settings(PRODUCT_IMPORT_CHUNK_SIZE=2), \
+                mock.patch.object(Product.objects, 'bulk_create', side_effect=failing_second_chunk):
+            response = self._import(body, 'text/csv')
+        data = response.json()
+        self.assertEqual(calls, [2, 2, 1])
+        self.assertEqual(data['created'], 3)
+        self.assertEqual([error['line'] for error in data['errors']], [4, 5])
+        self.assertEqual(Product.objects.count(), 3)
+    
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self._import('product_name,cost\nCoke,50\n', 'text/csv').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._import('{}', 'application/json').status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        self.assertEqual(
+            self._import('product_name,amount_available,cost\n', 'text/csv', token=self.buyer_token).status_code,
+            status.HTTP_403_FORBIDDEN
+        )
+    
+    def test_invalid_utf8_row(self):
+        body = b'product_name,amount_available,cost\nCoke,1,50\n\xff\xfe,1,50\nWater,1,20\n'
+        data = self._import(body, 'text/csv').json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual(data['errors'], [{'line': 3, 'errors': {'non_field_errors': ['Row is not valid UTF-8']}}])
+    
+    @override_settings(PRODUCT_IMPORT_CHUNK_SIZE=1)
+    def test_oversized_csv_field_is_a_row_error(self):
+        oversized = 'x' * (csv.field_size_limit() + 1)
+        body = f'product_name,amount_available,cost\nCoke,1,50\n"{oversized}",1,50\nWater,1,20\n'
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['line'] for error in data['errors']], [3])
+        self.assertIn('field larger than field limit', data['errors'][0]['errors']['non_field_errors'][0])
+    
+    def test_csv_byte_order_mark(self):
+        body = '\ufeffproduct_name,amount_available,cost\nCoke,1,50\n'.encode()
+        response = self._import(body, 'text/csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['created'], 1)
+    
+    def test_import_bumps_catalog_version(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        etag = self.client.get(reverse('product_list'))['ETag']
+        self._import('product_name,amount_available,cost\nCoke,1,50\n', 'text/csv')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        response = self.client.get(reverse('product_list'), headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
+    
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as source:
+            source.write('{"product_name": "Coke", "amount_available": 4, "cost": 50}\n{"product_name": "Bad", "amount_available": 1, "cost": 3}\n')
+        self.addCleanup(os.unlink, source.name)
+        
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_products', 'seller1', source.name, chunk_size=1, stdout=out, stderr=err)
+        self.assertIn('Created 1, updated 0, unchanged 0, 1 error(s)', out.getvalue())
+        self.assertIn('line 2: cost:', err.getvalue())
+        self.assertEqual(Product.objects.get(product_name='Coke').amount_available, 4)
+        
+        with self.assertRaises(CommandError):
+            call_command('import_products', 'buyer1', source.name, stdout=out)
+
+
+class ProductExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        token = generate_jwt_token(self.buyer)
+        ActiveSession.objects.create(user=self.buyer, token_digest=token_digest(token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for i in range(5):
+            Product.objects.create(product_name=f'Item, {i}', cost=5 * (i + 1), amount_available=i, seller=self.seller)
+    
+    def test_ndjson_matches_product_serializer(self):
+        response = self.client.get(reverse('product_export'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        expected = ProductSerializer(Product.objects.select_related('seller').order_by('id'), many=True).data
+        self.assertEqual([json.loads(line) for line in lines], json.loads(JSONRenderer().render(expected)))
+    
+    def test_csv(self):
+        response = self.client.get(reverse('product_export'), {'output': 'csv'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], ['id', 'product_name', 'amount_available', 'cost', 'seller_id', 'seller_username', 'created_at', 'updated_at'])
+        self.assertEqual([row[1] for row in rows[1:]], [f'Item, {i}' for i in range(5)])
+        self.assertEqual(rows[1][5], 'seller1')
+    
+    def test_rejects_unknown_format_and_anonymous(self):
+        self.assertEqual(self.client.get(reverse('product_export'), {'output': 'xml'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('product_export')).status_code, status.HTTP_403_FORBIDDEN)
+    
+    def test_streams_in_chunks_from_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(product_export.export_chunks('ndjson', chunk_size=2))
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+        self.assertEqual(len(queries), 1)
+        
+        async def collect():
+            return [chunk async for chunk in product_export.aiter_chunks(product_export.export_chunks('csv', chunk_size=2))]
+        self.assertEqual(len(async_to_sync(collect)()), 4)
+    
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('export_products', chunk_size=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'catalog.csv')
+            call_command('export_products', output=path)
+            with open(path, newline='') as exported:
+                self.assertEqual(len(list(csv.reader(exported))), 6)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer')
+        token = generate_jwt_token(self.buyer)
+        ActiveSession.objects.create(user=self.buyer, token_digest=token_digest(token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for name in ('Cherry Cola Extra Large Bottle', 'Coca Cola', 'Cola', 'Pepsi', 'Café Latte', 'Cocoa'):
+            Product.objects.create(product_name=name, cost=50, amount_available=1, seller=self.seller)
+    
+    def _search(self, q, **params):
+        response = self.client.get(reverse('product_list'), {'q': q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        return [product['product_name'] for product in response.json()]
+    
+    def test_prefix_match_on_word_starts(self):
+        self.assertEqual(set(self._search('co')), {'Coca Cola', 'Cola', 'Cherry Cola Extra Large Bottle', 'Cocoa'})
+        self.assertEqual(set(self._search('coc')), {'Coca Cola', 'Cocoa'})
+        self.assertEqual(self._search('ola'), [])
+    
+    def test_all_words_must_match(self):
+        self.assertEqual(self._search('coca co'), ['Coca Cola'])
+        self.assertEqual(self._search('cola, che!'), ['Cherry Cola Extra Large Bottle'])
+    
+    def test_relevance_order(self):
+        results = self._search('cola')
+        self.assertEqual(results[0], 'Cola')
+        self.assertEqual(results[-1], 'Cherry Cola Extra Large Bottle')
+    
+    def test_diacritics_ignored(self):
+        self.assertEqual(self._search('cafe'), ['Café Latte'])
+    
+    def test_index_follows_writes(self):
+        product = Product.objects.get(product_name='Pepsi')
+        product.product_name = 'Sprite'
+        product.save()
+        self.assertEqual(self._search('pep'), [])
+        self.assertEqual(self._search('spr'), ['Sprite'])
+        
+        product.delete()
+        self.assertEqual(self._search('spr'), [])
+        
+        Product.objects.bulk_create([Product(product_name='Sprite Zero', cost=5, amount_available=0, seller=self.seller)])
+        self.assertEqual(self._search('zer'), ['Sprite Zero'])
+        self.assertEqual(self._search('zer', in_stock='true'), [])
+    
+    def test_page_size_and_cursor(self):
+        response = self.client.get(reverse('product_list'), {'q': 'co', 'page_size': 2})
+        self.assertEqual(len(response.json()), 2)
+        self.assertNotIn('X-Next-Cursor', response)
+        
+        response = self.client.get(reverse('product_list'), {'q': 'co', 'cursor': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(self._search('')), 6)
+        self.assertEqual(self._search('!!'), [])
+    
+    def test_async_view_matches(self):
+        request = AsyncRequestFactory().get(
+            '/api/products/', {'q': 'coca co'}, headers={'Authorization': self.client._credentials['HTTP_AUTHORIZATION']}
+        )
+        response = async_to_sync(async_views.product_list)(request)
+        self.assertEqual([product['product_name'] for product in json.loads(response.content)], ['Coca Cola'])
+    
+    def test_fallback_without_fts5(self):
+        with mock.patch('sales.search.sqlite_has_fts5', return_value=False):
+            self.assertEqual(self._search('coca co'), ['Coca Cola'])
+    
+    def test_filters_and_ranking_cover_every_match(self):
+        other = User.objects.create_user(username='seller2', password='Pass123!', role='seller')
+        Product.objects.bulk_create(
+            Product(product_name=f'Cola Zero {i}', cost=5, amount_available=1, seller=self.seller) for i in range(1200)
+        )
+        Product.objects.create(product_name='Cola', cost=5, amount_available=1, seller=other)
+        rows = product_rows(Product.objects.all())
+        
+        self.assertEqual([row.product_name for row in search.search_queryset(rows.filter(seller=other), 'cola')], ['Cola'])
+        self.assertEqual(self._search('cola', seller_id=other.id), ['Cola'])
+        self.assertEqual(self._search('cola', page_size=3)[0], 'Cola')
+    
+    @override_settings(CATALOG_SNAPSHOT_TTL=0)
+    def test_install_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_insert')
+        Product.objects.create(product_name='Fanta', cost=50, amount_available=1, seller=self.seller)
+        self.assertEqual(self._search('fan'), [])
+        
+        search.install_search_index(connection)
+        self.assertEqual(self._search('fan'), ['Fanta'])
+
+
+@override_settings(STOCK_SHARDING=True, CATALOG_SNAPSHOT_TTL=0)
+class StockShardingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.seller = User.objects.create_user(username='seller1', password='Pass123!', role='seller')
+        self.buyer = User.objects.create_user(username='buyer1', password='Pass123!', role='buyer', deposit=1000)
+        self.buyer_token = generate_jwt_token(self.buyer)
+        ActiveSession.objects.create(user=self.buyer, token_digest=token_digest(self.buyer_token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.buyer_token}')
+        self.product = Product.objects.create(product_name='Coke', cost=5, amount_available=10, seller=self.seller)
+        call_command('shard_stock', self.product.id, 4, stdout=io.StringIO())
+    
+    def _shards(self):
+        return list(StockShard.objects.filter(product=self.product).order_by('shard').values_list('count', flat=True))
+    
+    def _buy(self, amount):
+        return self.client.post(reverse('buy'), {'product_id': self.product.id, 'amount': amount}, format='json')
+    
+    def _reported_stock(self):
+        detail = self.client.get(reverse('product_detail', kwargs={'pk': self.product.id})).data['amount_available']
+        listed = [p['amount_available'] for p in self.client.get(reverse('product_list')).json() if p['id'] == self.product.id]
+        self.assertEqual(listed, [detail])
+        return detail
+    
+    def test_shard_command_splits_and_folds_back(self):
+        self.assertEqual(stock.split_stock(10, 4), [3, 3, 2, 2])
+        self.assertEqual(self._shards(), [3, 3, 2, 2])
+        self.assertEqual(self._reported_stock(), 10)
+        
+        call_command('shard_stock', self.product.id, 3, stdout=io.StringIO())
+        self.assertEqual(self._shards(), [4, 3, 3])
+        call_command('shard_stock', self.product.id, 0, stdout=io.StringIO())
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock_shards, self.product.amount_available, self._shards()), (0, 10, []))
+        
+        with self.assertRaises(CommandError):
+            call_command('shard_stock', 9999, 4)
+    
+    def test_buy_takes_from_one_shard_without_touching_product_row(self):
+        # Shard 0 holds 3, so taking 2 does not empty it and trigger a rebalance.
+        with mock.patch('sales.stock.random.choice', side_effect=lambda shards: shards[0]), \
+                CaptureQueriesContext(connection) as queries:
+            response = self._buy(2)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['change'], [100, 100, 100, 100, 100, 100, 100, 100, 100, 50, 20, 20])
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('UPDATE "products"')])
+        self.assertEqual(self._shards(), [1, 3, 2, 2])
+        self.assertEqual(self._reported_stock(), 8)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 10)
+    
+    def test_emptied_shard_rebalances_and_sells_out(self):
+        call_command('shard_stock', self.product.id, 0, stdout=io.StringIO())
+        Product.objects.filter(id=self.product.id).update(amount_available=4)
+        call_command('shard_stock', self.product.id, 4, stdout=io.StringIO())
+        
+        self.assertEqual(self._buy(1).status_code, status.HTTP_200_OK)
+        self.assertEqual(self._shards(), [1, 1, 1, 0])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 3)
+        
+        for _ in range(3):
+            User.objects.filter(id=self.buyer.id).update(deposit=5)
+            self.assertEqual(self._buy(1).status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.amount_available, self._shards()), (0, [0, 0, 0, 0]))
+        self.assertEqual(self.client.get(reverse('product_list'), {'in_stock': 'true'}).json(), [])
+        self.assertIn('Insufficient product stock', self._buy(1).data['error'])
+    
+    def test_buy_across_shards(self):
+        response = self._buy(5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._shards(), [2, 1, 1, 1])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 5)
+    
+    def test_insufficient_stock_and_funds_keep_deposit(self):
+        self.assertIn('Insufficient product stock', self._buy(11).data['error'])
+        User.objects.filter(id=self.buyer.id).update(deposit=5)
+        self.assertIn('insufficient fund', self._buy(2).data['error'])
+        self.buyer.refresh_from_db()
+        self.assertEqual((self.buyer.deposit, sum(self._shards())), (5, 10))
+        
+        with mock.patch('sales.views.take_stock', side_effect=stock.InsufficientStock(self.product.id)):
+            self.assertEqual(self._buy(1).status_code, status.HTTP_400_BAD_REQUEST)
+        self.buyer.refresh_from_db()
+        self.assertEqual(self.buyer.deposit, 5)
+    
+    def test_without_update_returning(self):
+        with mock.patch('sales.stock._supports_update_returning', return_value=False):
+            self.assertTrue(stock.take_stock(self.product.id, 2, {2: 2}))
+            self.assertFalse(stock.take_stock(self.product.id, 1))
+        self.assertEqual(sum(self._shards()), 7)
+    
+    def test_restock_through_put_and_import(self):
+        seller_token = generate_jwt_token(self.seller)
+        ActiveSession.objects.create(user=self.seller, token_digest=token_digest(seller_token))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {seller_token}')
+        url = reverse('product_detail', kwargs={'pk': self.product.id})
+        
+        response = self.client.put(url, {'amount_available': 20}, format='json')
+        self.assertEqual(response.data['amount_available'], 20)
+        self.assertEqual(self._shards(), [5, 5, 5, 5])
+        response = self.client.put(url, {'cost': 10}, format='json')
+        self.assertEqual((response.data['amount_available'], self._shards()), (20, [5, 5, 5, 5]))
+        
+        self.client.post(
+            reverse('product_import'), 'product_name,amount_available,cost\nCoke,7,10\nPepsi,1,5\n', content_type='text/csv'
+        )
+        self.assertEqual(self._shards(), [2, 2, 2, 1])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amount_available, 7)
+    
+    def test_batch_buy_mixes_sharded_and_plain_products(self):
+        chips = Product.objects.create(product_name='Chips', cost=10, amount_available=3, seller=self.seller)
+        items = [{'product_id': self.product.id, 'amount': 4}, {'product_id': chips.id, 'amount': 1}]
+        response = self.client.post(reverse('buy_batch'), {'items': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(self._shards()), 6)
+        chips.refresh_from_db()
+        self.assertEqual(chips.amount_available, 2)
+        
+        items = [{'product_id': self.product.id, 'amount': 7}]
+        response = self.client.post(reverse('buy_batch'), {'items': items}, format='json')
+        self.assertEqual(response.data['product_ids'], [self.product.id])
+    
+    def test_sharded_product_sold_in_every_buy_mode(self):
+        for mode in ('locking', 'optimistic'):
+            User.objects.filter(id=self.buyer.id).update(deposit=5)
+            with self.subTest(mode=mode), self.settings(STOCK_SHARDING=False, BUY_MODE=mode):
+                self.assertEqual(self._buy(1).status_code, status.HTTP_200_OK)
+        self.assertEqual(sum(self._shards()), 8)
+        self.assertEqual(self._reported_stock(), 8)
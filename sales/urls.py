@@ -1,16 +1,25 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Under ASGI the read endpoints can run as native coroutines (see sales.async_views).
+read_views = async_views if getattr(settings, 'ASYNC_READ_VIEWS', False) else views
+auth_views = async_views if getattr(settings, 'ASYNC_AUTH_VIEWS', False) else views
 
 urlpatterns = [
-    path('register/', views.register, name='register'),
-    path('login/', views.login, name='login'),
+    path('register/', auth_views.register, name='register'),
+    path('login/', auth_views.login, name='login'),
+    path('token/refresh/', views.token_refresh, name='token_refresh'),
     path('logout/', views.logout, name='logout'),
     path('logout/all/', views.logout_all, name='logout_all'),
-    path('products/', views.product_list, name='product_list'),
-    path('products/<int:pk>/', views.product_detail, name='product_detail'),
+    path('products/', read_views.product_list, name='product_list'),
+    path('products/import/', views.product_import, name='product_import'),
+    path('products/export/', views.product_export, name='product_export'),
+    path('products/<int:pk>/', read_views.product_detail, name='product_detail'),
     path('deposit/', views.deposit, name='deposit'),
-    path('logout/force/', views.force_logout_all, name='force_logout_all'),
+    path('logout/force/', auth_views.force_logout_all, name='force_logout_all'),
     path('buy/', views.buy, name='buy'),
+    path('buy/batch/', views.buy_batch, name='buy_batch'),
     path('reset/', views.reset, name='reset'),
-    path('balance/', views.balance, name='balance'),
+    path('balance/', read_views.balance, name='balance'),
 ]
\ No newline at end of file
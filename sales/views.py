@@ -1,32 +1,64 @@
+from contextlib import nullcontext
 
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from django.contrib.auth import authenticate
+from rest_framework.exceptions import AuthenticationFailed
+from django.conf import settings
 from django.db import transaction
+from django.db.models import F
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import User, Product, ActiveSession
-from .serializers import UserSerializer, LoginSerializer, ProductSerializer, DepositSerializer, BuySerializer
-from .authentication import JWTAuthentication, generate_jwt_token
+from django.utils import timezone
+from django.utils.http import parse_etags
+from .models import User, Product, ActiveSession, token_digest
+from .serializers import (
+    UserSerializer, LoginSerializer, RefreshTokenSerializer, ProductSerializer, ProductListQuerySerializer,
+    DepositSerializer, BuySerializer, BatchBuySerializer, product_rows, serialize_product_row, serialize_product_rows
+)
+from .authentication import (
+    JWTAuthentication, generate_jwt_token, generate_access_token, generate_refresh_token,
+    refresh_access_token, refresh_tokens_enabled, revoke_sessions, session_lifetime
+)
 from .permissions import IsSeller, IsBuyer, IsSellerOwner
+from .hashing import HashingBusy, authenticate_credentials, hash_password
+from .product_import import IMPORT_CONTENT_TYPES, ImportFormatError, import_products, read_rows
+from .product_export import EXPORT_CONTENT_TYPES, aiter_chunks, export_chunks
+from .renderers import FastJSONRenderer
+from . import metrics
+from .change import ChangeUnavailable, accept_coin, dispense_change, expand_change, inventory_enabled
+from .pagination import InvalidCursor, paginate_keyset, next_page_link
+from .search import search_queryset
+from .stock import InsufficientStock, rebalance_stock, shard_counts, sharding_enabled, stock_totals, take_stock
+from .catalog import bump_catalog_version, get_catalog_version, catalog_etag, get_snapshot, set_snapshot
 from .schemas import (
-    register_schema, login_schema, logout_schema, logout_all_schema, force_logout_all_schema,
-    product_list_schema, product_detail_schema, balance_schema, deposit_schema, buy_schema, reset_schema
+    register_schema, login_schema, token_refresh_schema, logout_schema, logout_all_schema, force_logout_all_schema,
+    product_list_schema, product_import_schema, product_export_schema, product_detail_schema, balance_schema, deposit_schema, buy_schema,
+    buy_batch_schema, reset_schema
 )
 
+MAX_DEPOSIT = 100
+INVALID_CREDENTIALS = {'error': 'Invalid credentials'}
+HASHING_BUSY = {'error': 'Too many sign-in attempts in progress, please retry shortly'}
+SESSIONS_TERMINATED = {'message': 'All sessions terminated successfully. You can now login.'}
+
 @register_schema
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
     serializer = UserSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        return Response({
-            'message': 'User registered successfully',
-            'user': UserSerializer(user).data
-        }, status=status.HTTP_201_CREATED)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        password_hash = hash_password(serializer.validated_data['password'])
+    except HashingBusy:
+        return hashing_busy_response()
+    
+    user = serializer.save(password_hash=password_hash)
+    return Response(registration_payload(user), status=status.HTTP_201_CREATED)
 
 @login_schema
 @api_view(['POST'])
@@ -39,31 +71,74 @@ def login(request):
     username = serializer.validated_data['username']
     password = serializer.validated_data['password']
     
-    user = authenticate(username=username, password=password)
+    try:
+        user = authenticate_credentials(username, password, request)
+    except HashingBusy:
+        return hashing_busy_response()
     if not user:
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(INVALID_CREDENTIALS, status=status.HTTP_401_UNAUTHORIZED)
     
-    if ActiveSession.objects.filter(user=user).exists():
-        return Response({
+    data, status_code = start_session(user)
+    return Response(data, status=status_code)
+
+def registration_payload(user):
+    return {
+        'message': 'User registered successfully',
+        'user': UserSerializer(user).data
+    }
+
+def start_session(user):
+    if refresh_tokens_enabled():
+        session_token = generate_refresh_token(user)
+        data = {'token': generate_access_token(user), 'refresh_token': session_token}
+    else:
+        session_token = generate_jwt_token(user)
+        data = {'token': session_token}
+    
+    # A single insert: the one-session-per-user constraint is the check.
+    expires_at = timezone.now() + session_lifetime()
+    if not ActiveSession.objects.start(user, token_digest(session_token), expires_at):
+        return {
             'error': 'There is already an active session using your account',
             'message': 'Use /logout/all to terminate all active sessions'
-        }, status=status.HTTP_403_FORBIDDEN)
+        }, status.HTTP_403_FORBIDDEN
     
-    token = generate_jwt_token(user)
-    ActiveSession.objects.create(user=user, token=token)
+    data['user'] = UserSerializer(user).data
+    return data, status.HTTP_200_OK
+
+def hashing_busy_response():
+    response = Response(HASHING_BUSY, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = '1'
+    return response
+
+@token_refresh_schema
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    serializer = RefreshTokenSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    return Response({
-        'token': token,
-        'user': UserSerializer(user).data
-    }, status=status.HTTP_200_OK)
+    try:
+        token = refresh_access_token(serializer.validated_data['refresh_token'])
+    except AuthenticationFailed as exc:
+        return Response({'error': exc.detail}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return Response({'token': token}, status=status.HTTP_200_OK)
 
 @logout_schema
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def logout(request):
+    if refresh_tokens_enabled():
+        revoke_sessions(request.user)
+        return Response({'message': 'Logged out successfully'}, status=status.HTTP_200_OK)
+    
     token = request.auth
-    ActiveSession.objects.filter(token=token).delete()
+    ActiveSession.objects.filter(token_digest=token_digest(token)).delete()
+    JWTAuthentication.invalidate_token(token)
     return Response({'message': 'Logged out successfully'}, status=status.HTTP_200_OK)
 
 @logout_all_schema
@@ -71,7 +146,7 @@ def logout(request):
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsAuthenticated])
 def logout_all(request):
-    ActiveSession.objects.filter(user=request.user).delete()
+    revoke_sessions(request.user)
     return Response({'message': 'All sessions terminated successfully'}, status=status.HTTP_200_OK)
 
 @force_logout_all_schema
@@ -85,21 +160,56 @@ def force_logout_all(request):
     username = serializer.validated_data['username']
     password = serializer.validated_data['password']
     
-    user = authenticate(username=username, password=password)
+    try:
+        user = authenticate_credentials(username, password, request)
+    except HashingBusy:
+        return hashing_busy_response()
     if not user:
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(INVALID_CREDENTIALS, status=status.HTTP_401_UNAUTHORIZED)
     
-    ActiveSession.objects.filter(user=user).delete()
-    return Response({'message': 'All sessions terminated successfully. You can now login.'}, status=status.HTTP_200_OK)
+    revoke_sessions(user)
+    return Response(SESSIONS_TERMINATED, status=status.HTTP_200_OK)
 
 @product_list_schema
 @api_view(['GET', 'POST'])
 @authentication_classes([JWTAuthentication])
 def product_list(request):
     if request.method == 'GET':
-        products = Product.objects.select_related('seller').all()
-        serializer = ProductSerializer(products, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        version = get_catalog_version()
+        etag = catalog_etag(version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        
+        query = ProductListQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params = query.validated_data
+        
+        snapshot = get_snapshot(version, params)
+        if snapshot is None:
+            try:
+                if params.get('q'):
+                    products = list(search_queryset(filter_product_rows(params), params['q'], params.get('page_size')))
+                    next_cursor = None
+                else:
+                    products, next_cursor = paginate_keyset(
+                        filter_product_rows(params), params.get('cursor'), params.get('page_size')
+                    )
+            except InvalidCursor:
+                return Response({'error': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            snapshot = (FastJSONRenderer().render(serialize_product_rows(products)), next_cursor)
+            set_snapshot(version, params, snapshot)
+        
+        content, next_cursor = snapshot
+        response = HttpResponse(content, content_type='application/json', status=status.HTTP_200_OK)
+        response['ETag'] = etag
+        if next_cursor:
+            response['X-Next-Cursor'] = next_cursor
+            response['Link'] = next_page_link(request, next_cursor)
+        return response
     
     elif request.method == 'POST':
         if request.user.role != 'seller':
@@ -111,17 +221,69 @@ def product_list(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def filter_product_rows(params):
+    products = product_rows(Product.objects.all())
+    if 'seller_id' in params:
+        products = products.filter(seller_id=params['seller_id'])
+    if 'min_cost' in params:
+        products = products.filter(cost__gte=params['min_cost'])
+    if 'max_cost' in params:
+        products = products.filter(cost__lte=params['max_cost'])
+    if params['in_stock']:
+        products = products.filter(amount_available__gt=0)
+    return products
+
+@product_import_schema
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsSeller])
+def product_import(request):
+    # The body is read straight from the request stream, a line at a time,
+    # instead of going through request.data.
+    import_format = IMPORT_CONTENT_TYPES.get(request.content_type.split(';')[0].strip().lower())
+    if import_format is None:
+        return Response(
+            {'error': f'Send the rows as {" or ".join(IMPORT_CONTENT_TYPES)}'},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+    
+    try:
+        result = import_products(request.user, read_rows(request.stream or (), import_format))
+    except ImportFormatError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(result, status=status.HTTP_200_OK)
+
+@product_export_schema
+@api_view(['GET'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsAuthenticated])
+def product_export(request):
+    export_format = request.query_params.get('output', 'ndjson')
+    if export_format not in EXPORT_CONTENT_TYPES:
+        return Response(
+            {'error': f'output must be one of: {", ".join(EXPORT_CONTENT_TYPES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # The query runs while the response is being sent, not in this view.
+    chunks = export_chunks(export_format)
+    if isinstance(request._request, ASGIRequest):
+        chunks = aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+    return response
+
 @product_detail_schema
 @api_view(['GET', 'PUT', 'DELETE'])
 @authentication_classes([JWTAuthentication])
 def product_detail(request, pk):
-    product = get_object_or_404(Product.objects.select_related('seller'), pk=pk)
-    
     if request.method == 'GET':
-        serializer = ProductSerializer(product)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        row = get_object_or_404(product_rows(Product.objects.all()), pk=pk)
+        return Response(serialize_product_row(row), status=status.HTTP_200_OK)
     
-    elif request.method == 'PUT':
+    product = get_object_or_404(Product.objects.select_related('seller'), pk=pk)
+    
+    if request.method == 'PUT':
         if request.user.role != 'seller':
             return Response({'error': 'Only sellers can update products'}, status=status.HTTP_403_FORBIDDEN)
         
@@ -149,9 +311,12 @@ def product_detail(request, pk):
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsBuyer])
 def balance(request):
+    # The cached principal's deposit can lag behind purchases and deposits
+    # made through another worker; the balance is always read fresh.
+    deposit = User.objects.filter(id=request.user.id).values_list('deposit', flat=True).get()
     return Response({
         'username': request.user.username,
-        'deposit': request.user.deposit
+        'deposit': deposit
     }, status=status.HTTP_200_OK)
 
 @deposit_schema
@@ -164,18 +329,18 @@ def deposit(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     coin = serializer.validated_data['coin']
-    user = request.user
-    
-    new_deposit = user.deposit + coin
-    if new_deposit > 100:
-        return Response({'error': 'Maximum deposit limit is 100 cents'}, status=status.HTTP_400_BAD_REQUEST)
     
-    user.deposit = new_deposit
-    user.save()
+    # Only pay for a transaction when the coin also has to land in the inventory.
+    with transaction.atomic() if inventory_enabled() else nullcontext():
+        new_deposit = User.objects.credit_deposit(request.user.id, coin, limit=MAX_DEPOSIT)
+        if new_deposit is None:
+            return Response({'error': f'Maximum deposit limit is {MAX_DEPOSIT} cents'}, status=status.HTTP_400_BAD_REQUEST)
+        accept_coin(coin)
+    JWTAuthentication.invalidate_user(request.user.id)
     
     return Response({
         'message': f'{coin} cents deposited successfully',
-        'current_deposit': user.deposit
+        'current_deposit': new_deposit
     }, status=status.HTTP_200_OK)
 
 @buy_schema
@@ -190,17 +355,34 @@ def buy(request):
     product_id = serializer.validated_data['product_id']
     amount = serializer.validated_data['amount']
     
+    if sharding_enabled():
+        # Find out whether the product is sharded before anything locks its row.
+        product = Product.objects.filter(id=product_id).only('id', 'cost', 'product_name', 'stock_shards').first()
+        if product is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        if product.stock_shards:
+            return buy_sharded(request, product, amount)
+    
+    if getattr(settings, 'BUY_MODE', 'locking') == 'optimistic':
+        return buy_optimistic(request, product_id, amount)
+    
     try:
         with transaction.atomic():
             product = Product.objects.select_for_update().select_related('seller').get(id=product_id)
+            if product.stock_shards:
+                # Sharded while STOCK_SHARDING is off: the shards still hold
+                # the stock, but buyers queue on this lock.
+                return buy_sharded(request, product, amount)
             user = User.objects.select_for_update().get(id=request.user.id)
             
             if product.amount_available < amount:
+                metrics.INSUFFICIENT_STOCK.inc()
                 return Response({'error': 'Insufficient product stock'}, status=status.HTTP_400_BAD_REQUEST)
             
             total_cost = product.cost * amount
             
             if user.deposit < total_cost:
+                metrics.INSUFFICIENT_FUNDS.inc()
                 return Response({'error': 'You have insufficient fund for this purchase'}, status=status.HTTP_400_BAD_REQUEST)
             
             product.amount_available -= amount
@@ -210,8 +392,14 @@ def buy(request):
             user.deposit = 0
             user.save()
             
-            change_breakdown = calculate_change(change)
+            try:
+                change_breakdown = calculate_change(change)
+            except ChangeUnavailable:
+                transaction.set_rollback(True)
+                return change_unavailable_response()
             
+            metrics.PURCHASES.inc()
+            metrics.ITEMS_SOLD.inc(amount)
             return Response({
                 'total_spent': total_cost,
                 'product_purchased': product.product_name,
@@ -222,15 +410,198 @@ def buy(request):
     except Product.DoesNotExist:
         return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
+def buy_optimistic(request, product_id, amount):
+    # No SELECT ... FOR UPDATE: both writes are guarded UPDATEs, and the
+    # CheckConstraints on stock and deposit back them up. The stock is taken
+    # first, so rows are locked in the same order as buy and buy_batch
+    # (products, then users) and concurrent purchases cannot deadlock.
+    while True:
+        product = Product.objects.filter(id=product_id).only(
+            'id', 'cost', 'product_name', 'amount_available', 'stock_shards'
+        ).first()
+        if product is None:
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+        if product.stock_shards:
+            return buy_sharded(request, product, amount)
+        
+        if product.amount_available < amount:
+            metrics.INSUFFICIENT_STOCK.inc()
+            return Response({'error': 'Insufficient product stock'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        total_cost = product.cost * amount
+        
+        with transaction.atomic():
+            updated = Product.objects.filter(
+                id=product_id, cost=product.cost, amount_available__gte=amount
+            ).update(amount_available=F('amount_available') - amount, updated_at=timezone.now())
+            
+            if updated:
+                previous_deposit = User.objects.take_deposit(request.user.id, expected=request.user.deposit, minimum=total_cost)
+                if previous_deposit is None:
+                    transaction.set_rollback(True)
+                    metrics.INSUFFICIENT_FUNDS.inc()
+                    return Response({'error': 'You have insufficient fund for this purchase'}, status=status.HTTP_400_BAD_REQUEST)
+                
+                try:
+                    change_breakdown = calculate_change(previous_deposit - total_cost)
+                except ChangeUnavailable:
+                    transaction.set_rollback(True)
+                    return change_unavailable_response()
+        
+        if not updated:
+            # Stock ran out, the product vanished or its price changed since
+            # the read above: re-read and decide again.
+            continue
+        
+        JWTAuthentication.invalidate_user(request.user.id)
+        bump_catalog_version()
+        metrics.PURCHASES.inc()
+        metrics.ITEMS_SOLD.inc(amount)
+        
+        return Response({
+            'total_spent': total_cost,
+            'product_purchased': product.product_name,
+            'amount_purchased': amount,
+            'change': change_breakdown
+        }, status=status.HTTP_200_OK)
+
+def buy_sharded(request, product, amount):
+    # Stock comes off one of the product's shards (see stock.py) and the
+    # deposit off a guarded UPDATE, so no row is locked across reads and the
+    # products row is only written when a shard runs dry.
+    counts = shard_counts(product.id)
+    if sum(counts.values()) < amount:
+        metrics.INSUFFICIENT_STOCK.inc()
+        return Response({'error': 'Insufficient product stock'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    total_cost = product.cost * amount
+    
+    with transaction.atomic():
+        previous_deposit = User.objects.take_deposit(request.user.id, expected=request.user.deposit, minimum=total_cost)
+        if previous_deposit is None:
+            metrics.INSUFFICIENT_FUNDS.inc()
+            return Response({'error': 'You have insufficient fund for this purchase'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            emptied_shard = take_stock(product.id, amount, counts)
+        except InsufficientStock:
+            # Sold out since the read above.
+            transaction.set_rollback(True)
+            metrics.INSUFFICIENT_STOCK.inc()
+            return Response({'error': 'Insufficient product stock'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            change_breakdown = calculate_change(previous_deposit - total_cost)
+        except ChangeUnavailable:
+            transaction.set_rollback(True)
+            return change_unavailable_response()
+    
+    if emptied_shard:
+        rebalance_stock(product.id)
+    JWTAuthentication.invalidate_user(request.user.id)
+    bump_catalog_version()
+    metrics.PURCHASES.inc()
+    metrics.ITEMS_SOLD.inc(amount)
+    
+    return Response({
+        'total_spent': total_cost,
+        'product_purchased': product.product_name,
+        'amount_purchased': amount,
+        'change': change_breakdown
+    }, status=status.HTTP_200_OK)
+
+@buy_batch_schema
+@api_view(['POST'])
+@authentication_classes([JWTAuthentication])
+@permission_classes([IsBuyer])
+def buy_batch(request):
+    serializer = BatchBuySerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    amounts = serializer.validated_data['items']
+    
+    with transaction.atomic():
+        # Lock products in ascending id order, then the buyer, so concurrent
+        # batches (and single buys, which lock product then user) cannot deadlock.
+        products = list(Product.objects.select_for_update().filter(id__in=amounts).order_by('id'))
+        user = User.objects.select_for_update().get(id=request.user.id)
+        
+        missing = sorted(set(amounts) - {product.id for product in products})
+        if missing:
+            return Response({'error': 'Product not found', 'product_ids': missing}, status=status.HTTP_404_NOT_FOUND)
+        
+        stock = stock_totals(products)
+        out_of_stock = [product.id for product in products if stock[product.id] < amounts[product.id]]
+        if out_of_stock:
+            metrics.INSUFFICIENT_STOCK.inc()
+            return Response({'error': 'Insufficient product stock', 'product_ids': out_of_stock}, status=status.HTTP_400_BAD_REQUEST)
+        
+        total_cost = sum(product.cost * amounts[product.id] for product in products)
+        
+        if user.deposit < total_cost:
+            metrics.INSUFFICIENT_FUNDS.inc()
+            return Response({'error': 'You have insufficient fund for this purchase'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        now = timezone.now()
+        unsharded = [product for product in products if not product.stock_shards]
+        for product in unsharded:
+            product.amount_available -= amounts[product.id]
+            product.updated_at = now
+        Product.objects.bulk_update(unsharded, ['amount_available', 'updated_at'])
+        for product in products:
+            if not product.stock_shards:
+                continue
+            try:
+                emptied_shard = take_stock(product.id, amounts[product.id])
+            except InsufficientStock:
+                # Single buys of sharded products do not wait on the row lock held here.
+                transaction.set_rollback(True)
+                metrics.INSUFFICIENT_STOCK.inc()
+                return Response({'error': 'Insufficient product stock', 'product_ids': [product.id]}, status=status.HTTP_400_BAD_REQUEST)
+            if emptied_shard:
+                rebalance_stock(product.id)
+        bump_catalog_version()
+        
+        change = user.deposit - total_cost
+        user.deposit = 0
+        user.save(update_fields=['deposit'])
+        
+        try:
+            change_breakdown = calculate_change(change)
+        except ChangeUnavailable:
+            transaction.set_rollback(True)
+            return change_unavailable_response()
+        
+        metrics.PURCHASES.inc()
+        metrics.ITEMS_SOLD.inc(sum(amounts.values()))
+        return Response({
+            'total_spent': total_cost,
+            'products_purchased': [
+                {
+                    'product_id': product.id,
+                    'product_name': product.product_name,
+                    'amount_purchased': amounts[product.id],
+                    'cost': product.cost,
+                }
+                for product in products
+            ],
+            'change': change_breakdown
+        }, status=status.HTTP_200_OK)
+
 @reset_schema
 @api_view(['POST'])
 @authentication_classes([JWTAuthentication])
 @permission_classes([IsBuyer])
 def reset(request):
-    user = request.user
-    previous_deposit = user.deposit
-    user.deposit = 0
-    user.save()
+    with transaction.atomic():
+        previous_deposit = User.objects.reset_deposit(request.user.id, expected=request.user.deposit)
+        try:
+            calculate_change(previous_deposit)
+        except ChangeUnavailable:
+            transaction.set_rollback(True)
+            return Response({'error': 'The machine cannot return your deposit in coins right now'}, status=status.HTTP_400_BAD_REQUEST)
+    JWTAuthentication.invalidate_user(request.user.id)
     
     return Response({
         'message': 'Deposit reset successfully',
@@ -240,13 +611,10 @@ def reset(request):
 
 
 def calculate_change(amount):
-    coins = [100, 50, 20, 10, 5]
-    change_breakdown = []
-    
-    for coin in coins:
-        while amount >= coin:
-            change_breakdown.append(coin)
-            amount -= coin
-    
-    return change_breakdown
+    breakdown = dispense_change(amount)
+    metrics.record_change(breakdown)
+    return expand_change(breakdown)
+
 
+def change_unavailable_response():
+    return Response({'error': 'The machine cannot return change for this purchase'}, status=status.HTTP_400_BAD_REQUEST)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vending_machine.settings')
 
 application = get_asgi_application()
+
+# Fail fast on an unreachable database or pool instead of on the first request.
+from sales.checks import check_database_on_startup  # noqa: E402
+
+check_database_on_startup()